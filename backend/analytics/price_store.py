@@ -0,0 +1,224 @@
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # analytics is optional; the API runs without numpy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR")
+
+COLUMNS = {
+    "timestamps": "int64",  # epoch seconds
+    "final": "float32",
+    "initial": "float32",
+    "discount": "int16",
+}
+PENDING_DTYPE = [("game_id", "int64"), ("timestamps", "int64"), ("final", "float32"), ("initial", "float32"), ("discount", "int16")]
+
+def _epoch(value) -> int:
+    if value is None:
+        return int(datetime.now(timezone.utc).timestamp())
+    return int(datetime.fromisoformat(value).timestamp())
+
+class PriceHistoryView:
+    # rows sorted by (game_id, timestamp); game i owns rows offsets[i]:offsets[i + 1]
+    def __init__(self, game_ids, offsets, columns: dict):
+        self.game_ids = game_ids
+        self.offsets = offsets
+        self.timestamps = columns["timestamps"]
+        self.final = columns["final"]
+        self.initial = columns["initial"]
+        self.discount = columns["discount"]
+
+    @classmethod
+    def from_records(cls, records):
+        order = np.lexsort((records["timestamps"], records["game_id"]))
+        records = records[order]
+        game_ids, starts = np.unique(records["game_id"], return_index=True)
+        offsets = np.append(starts, len(records)).astype("int64")
+        return cls(game_ids, offsets, {name: np.ascontiguousarray(records[name]) for name in COLUMNS})
+
+    def to_records(self):
+        records = np.empty(len(self.final), dtype=PENDING_DTYPE)
+        records["game_id"] = np.repeat(self.game_ids, np.diff(self.offsets))
+        for name in COLUMNS:
+            records[name] = getattr(self, name)
+        return records
+
+    def history(self, game_id: int) -> dict:
+        index = np.searchsorted(self.game_ids, game_id)
+        if index >= len(self.game_ids) or self.game_ids[index] != game_id:
+            return {"timestamps": self.timestamps[:0], "final": self.final[:0]}
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return {"timestamps": self.timestamps[start:end], "final": self.final[start:end]}
+
+    def all_time_lows(self):
+        return dict(zip(self.game_ids.tolist(), np.minimum.reduceat(self.final, self.offsets[:-1]).tolist()))
+
+    def average_sale_depth(self):
+        # mean discount over the rows where a game was actually on sale
+        on_sale = self.discount > 0
+        depth = np.add.reduceat(np.where(on_sale, self.discount, 0).astype("float64"), self.offsets[:-1])
+        sale_rows = np.add.reduceat(on_sale.astype("int64"), self.offsets[:-1])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = depth / sale_rows
+        has_sales = sale_rows > 0
+        return dict(zip(self.game_ids[has_sales].tolist(), average[has_sales].round(1).tolist()))
+
+    def games_at_lowest_price(self):
+        lows = np.minimum.reduceat(self.final, self.offsets[:-1])
+        current = self.final[self.offsets[1:] - 1]
+        return self.game_ids[current <= lows].tolist()
+
+def _to_records(rows: list):
+    records = np.empty(len(rows), dtype=PENDING_DTYPE)
+    for i, row in enumerate(rows):
+        records[i] = (
+            row["game_id"],
+            _epoch(row.get("timestamp")),
+            row["final_price"],
+            row.get("initial_price") or row["final_price"],
+            row.get("discount_percent") or 0,
+        )
+    return records
+
+class PriceStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.base_path = os.path.join(path, "base")
+        self.pending_path = os.path.join(path, "pending.bin")
+        self._lock = threading.Lock()
+
+    def append(self, rows: list):
+        if not rows:
+            return
+        records = _to_records(rows)
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(self.pending_path, "ab") as pending:
+            pending.write(records.tobytes())
+
+    def _load_base(self, mmap: bool):
+        if not os.path.exists(os.path.join(self.base_path, "game_ids.npy")):
+            return None
+        mode = "r" if mmap else None
+        load = lambda name: np.load(os.path.join(self.base_path, f"{name}.npy"), mmap_mode=mode)
+        return PriceHistoryView(load("game_ids"), load("offsets"), {name: load(name) for name in COLUMNS})
+
+    def _pending_files(self) -> list:
+        # pending.bin plus any rotated copies a compaction or export hasn't folded in yet
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                      if name.startswith("pending") and name.endswith(".bin"))
+
+    def _load_pending(self, paths: list = None):
+        paths = self._pending_files() if paths is None else paths
+        parts = [np.fromfile(path, dtype=PENDING_DTYPE) for path in paths if os.path.exists(path)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=PENDING_DTYPE)
+
+    def _rotate_pending(self) -> list:
+        # appends in other processes reopen pending.bin each time, so anything written after
+        # the rename starts a fresh file instead of being deleted with the rows just read
+        if os.path.exists(self.pending_path):
+            os.replace(self.pending_path, os.path.join(self.path, f"pending.{time.time_ns()}.bin"))
+        return [path for path in self._pending_files() if path != self.pending_path]
+
+    @staticmethod
+    def _merge(base, pending) -> PriceHistoryView:
+        if base is None:
+            return PriceHistoryView.from_records(pending)
+        if not len(pending):
+            return base
+        return PriceHistoryView.from_records(np.concatenate([base.to_records(), pending]))
+
+    def load(self, mmap: bool = True) -> PriceHistoryView:
+        return self._merge(self._load_base(mmap), self._load_pending())
+
+    def _write_base(self, view: PriceHistoryView):
+        # write beside the live copy, then swap, so readers never see half a store
+        staging = self.base_path + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        np.save(os.path.join(staging, "game_ids.npy"), view.game_ids)
+        np.save(os.path.join(staging, "offsets.npy"), view.offsets)
+        for name in COLUMNS:
+            np.save(os.path.join(staging, f"{name}.npy"), getattr(view, name))
+        old = self.base_path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.base_path):
+            os.replace(self.base_path, old)
+        os.replace(staging, self.base_path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def compact(self):
+        with self._lock:
+            rotated = self._rotate_pending()
+            view = self._merge(self._load_base(mmap=False), self._load_pending(rotated))
+            self._write_base(view)
+            for path in rotated:
+                os.remove(path)
+        logger.info(f"Price store compacted: {len(view.game_ids)} games, {len(view.final)} rows.")
+
+    def export_from_supabase(self):
+        from backend.supabase_client import supabase
+        from backend.supabase_services.db import fetch_pages
+
+        # rows appended before the scan starts are already in price_history; later ones stay pending
+        with self._lock:
+            rotated = self._rotate_pending()
+
+        rows = [row for page in fetch_pages(
+            lambda: supabase.table("price_history")
+            .select("game_id, timestamp, initial_price, final_price, discount_percent").order("id")
+        ) for row in page]
+
+        view = PriceHistoryView.from_records(_to_records(rows))
+        with self._lock:
+            self._write_base(view)
+            for path in rotated:
+                os.remove(path)
+        logger.info(f"Exported {len(rows)} price history rows to {self.path}.")
+
+price_store = PriceStore(PRICE_STORE_DIR) if PRICE_STORE_DIR and np is not None else None
+
+def record_price_history(rows: list):
+    # called on every insert so the local store stays current between exports
+    if price_store is None:
+        return
+    try:
+        price_store.append(rows)
+    except Exception as e:
+        logger.error(f"Failed to append to price store: {e}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    if np is None:
+        sys.exit("numpy is required for the price store.")
+    if not PRICE_STORE_DIR:
+        sys.exit("Set PRICE_STORE_DIR to the store directory.")
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    store = PriceStore(PRICE_STORE_DIR)
+    if command == "export":
+        store.export_from_supabase()
+    elif command == "compact":
+        store.compact()
+    elif command == "report":
+        view = store.load()
+        lows = view.all_time_lows()
+        depth = view.average_sale_depth()
+        at_low = view.games_at_lowest_price()
+        print(f"{len(view.game_ids)} games, {len(view.final)} rows")
+        print(f"{len(at_low)} games at their lowest price ever")
+        if depth:
+            print(f"average sale depth across games: {sum(depth.values()) / len(depth):.1f}%")
+        print(f"all-time lows computed for {len(lows)} games")
+    else:
+        sys.exit(f"Unknown command {command}; use export, compact or report.")
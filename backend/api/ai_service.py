@@ -1,36 +1,100 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import hashlib
 import os
 import json
+import time
+from collections import deque
 from fastapi import HTTPException
 from backend.supabase_client import supabase
+from backend.api.cache import TTLCache
+from backend.supabase_services.db import run_query
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-async def get_ai_game_recommendation(user_id: str, user_input: str = None):
-    try:
-        DAILY_LIMIT = 10
-
-        yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-        recent_requests = supabase.table("ai_request_logs").select("id").eq("user_id", user_id).gte("created_at", yesterday).execute()
-
-        if len(recent_requests.data) >= DAILY_LIMIT:
+AI_MODEL = "gpt-4.1-nano-2025-04-14"
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "30"))
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+DAILY_LIMIT = 10
+QUOTA_WINDOW = timedelta(days=1)
+
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=AI_TIMEOUT, max_retries=1)
+completion_slots = asyncio.Semaphore(AI_CONCURRENCY)
+
+# identical tracked sets or prompts get the same answer without paying for another completion
+recommendation_cache = TTLCache(
+    maxsize=int(os.getenv("AI_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("AI_CACHE_TTL", "21600")),
+    name="ai_recommendations"
+)
+
+class SlidingWindowQuota:
+    # per-user request times over the last window; ai_request_logs is shared by every worker, so it is
+    # re-read before each paid request and the local copy only answers remaining()
+    def __init__(self, limit: int, window: timedelta):
+        self.limit = limit
+        self.window = window.total_seconds()
+        self._requests = {}  # user_id -> deque of epoch seconds, oldest first; dropped once empty
+
+    def _load(self, user_id: str) -> deque:
+        since = (datetime.now(timezone.utc) - timedelta(seconds=self.window)).isoformat()
+        result = supabase.table("ai_request_logs").select("created_at").eq("user_id", user_id).gte("created_at", since).execute()
+        return deque(sorted(datetime.fromisoformat(row["created_at"]).timestamp() for row in result.data or []))
+
+    def _prune(self, user_id: str, requests: deque) -> deque:
+        cutoff = time.time() - self.window
+        while requests and requests[0] <= cutoff:
+            requests.popleft()
+        if requests:
+            self._requests[user_id] = requests
+        else:
+            self._requests.pop(user_id, None)
+        return requests
+
+    async def remaining(self, user_id: str) -> int:
+        requests = self._requests.get(user_id)
+        if requests is None:
+            requests = await run_query(self._load, user_id, name="ai_service.load_quota")
+        return max(0, self.limit - len(self._prune(user_id, requests)))
+
+    async def consume(self, user_id: str) -> int:
+        # other workers' requests only show up in the shared log
+        requests = await run_query(self._load, user_id, name="ai_service.load_quota")
+        if len(requests) >= self.limit:
+            self._prune(user_id, requests)
             raise HTTPException(
                 status_code=429,
-                detail=f"Daily limit reached. You can make {DAILY_LIMIT} AI requests per day. Try again tomorrow!"
+                detail=f"Daily limit reached. You can make {self.limit} AI requests per day. Try again tomorrow!"
             )
+        # logged before the completion is paid for, so the next check on any worker counts it
+        await run_query(_log_request, user_id)
+        requests.append(time.time())
+        return self.limit - len(self._prune(user_id, requests))
 
+def _log_request(user_id: str):
+    try:
         supabase.table("ai_request_logs").insert({"user_id": user_id}).execute()
+    except Exception as e:
+        logger.error(f"Failed to log AI request for {user_id}: {e}")
 
-        tracked = supabase.table("user_games").select("*, games(name, app_id)").eq("user_id", user_id).execute()
+quota = SlidingWindowQuota(DAILY_LIMIT, QUOTA_WINDOW)
 
-        tracked_games = [game["games"]["name"] for game in tracked.data if game.get('games')]
+def _get_tracked_game_names(user_id: str) -> list:
+    tracked = supabase.table("user_games").select("*, games(name, app_id)").eq("user_id", user_id).execute()
+    return [game["games"]["name"] for game in tracked.data if game.get('games')]
 
-        if user_input:
-            prompt = f"""You are a Steam game recommendation expert.
+def recommendation_key(tracked_games: list, user_input: str = None) -> str:
+    if user_input:
+        basis = "input:" + " ".join(user_input.lower().split())
+    else:
+        basis = "tracked:" + "\n".join(sorted(set(tracked_games)))
+    return hashlib.sha256(basis.encode()).hexdigest()
+
+def build_prompt(tracked_games: list, user_input: str = None) -> str:
+    if user_input:
+        prompt = f"""You are a Steam game recommendation expert.
 
   User's request: {user_input}
 
@@ -48,11 +112,8 @@ async def get_ai_game_recommendation(user_id: str, user_input: str = None):
     ]
   }}"""
 
-        else:
-            if not tracked_games:
-                raise HTTPException(status_code=400, detail="No tracked games to analyze. Please track some games first or describe your preferences.")
-
-            prompt = f"""You are a Steam game recommendation expert.
+    else:
+        prompt = f"""You are a Steam game recommendation expert.
 
   User is currently tracking these games: {', '.join(tracked_games)}
   
@@ -71,10 +132,12 @@ async def get_ai_game_recommendation(user_id: str, user_input: str = None):
       }}
     ]
   }}"""
+    return prompt
 
-
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1-nano-2025-04-14",
+async def generate_recommendations(prompt: str, tracked_games: list, user_input: str = None) -> dict:
+    async with completion_slots:
+        response = await openai_client.chat.completions.create(
+            model=AI_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -89,43 +152,66 @@ async def get_ai_game_recommendation(user_id: str, user_input: str = None):
             max_tokens=1000
         )
 
-        content = response.choices[0].message.content.strip()
+    content = response.choices[0].message.content.strip()
 
-        if content.startswith("```"):
-            content = content.split("```")[1]
-            if content.startswith("json"):
-                content = content[4:]
-            content = content.strip()
+    if content.startswith("```"):
+        content = content.split("```")[1]
+        if content.startswith("json"):
+            content = content[4:]
+        content = content.strip()
 
+    try:
         recommendations = json.loads(content)
+    except json.JSONDecodeError:
+        logger.error(f"Raw content: {content}")
+        raise
 
-        if not user_input and tracked_games:
-            tracked_games_lower = [game.lower() for game in tracked_games]
+    if not user_input and tracked_games:
+        tracked_games_lower = [game.lower() for game in tracked_games]
 
-            original_count = len(recommendations.get("recommendations", []))
+        original_count = len(recommendations.get("recommendations", []))
 
-            filter_recs = [
-                rec for rec in recommendations.get("recommendations", [])
-                if rec.get("title", "").lower() not in tracked_games_lower
-            ]
-            recommendations["recommendations"] = filter_recs
+        filter_recs = [
+            rec for rec in recommendations.get("recommendations", [])
+            if rec.get("title", "").lower() not in tracked_games_lower
+        ]
+        recommendations["recommendations"] = filter_recs
 
 
-            if len(filter_recs) < original_count:
-                logger.warning(f"Filtered {original_count - len(filter_recs)} already tracked games from AI recommendations")
+        if len(filter_recs) < original_count:
+            logger.warning(f"Filtered {original_count - len(filter_recs)} already tracked games from AI recommendations")
+    return recommendations
 
-        logger.info(f"AI recommendations generated for {user_id} using gpt-4.1-nano")
+async def get_ai_game_recommendation(user_id: str, user_input: str = None):
+    try:
+        tracked_games = await run_query(_get_tracked_game_names, user_id)
+        if not user_input and not tracked_games:
+            raise HTTPException(status_code=400, detail="No tracked games to analyze. Please track some games first or describe your preferences.")
+
+        key = recommendation_key(tracked_games, user_input)
+        recommendations = recommendation_cache.get(key, count_miss=False)
+        if recommendations is not None:
+            requests_remaining = await quota.remaining(user_id)
+            logger.info(f"AI recommendations for {user_id} served from cache")
+        else:
+            requests_remaining = await quota.consume(user_id)
+            prompt = build_prompt(tracked_games, user_input)
+            recommendations = await recommendation_cache.get_or_fetch(
+                key, lambda: generate_recommendations(prompt, tracked_games, user_input)
+            )
+            logger.info(f"AI recommendations generated for {user_id} using gpt-4.1-nano")
 
         return {
             "reasoning": recommendations.get("reasoning", ""),
             "recommendations": recommendations.get("recommendations", []),
             "based_on_tracked_games": not bool(user_input),
             "tracked_games_count": len(tracked_games),
-            "requests_remaining": DAILY_LIMIT - len(recent_requests.data) - 1
+            "requests_remaining": requests_remaining
         }
+    except HTTPException:
+        raise
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse AI response: {e}")
-        logger.error(f"Raw content: {content}")
         raise HTTPException(status_code=500, detail="Failed to parse AI recommendations")
     except Exception as e:
         logger.error(f"Error generating AI recommendations: {e}")
@@ -1,13 +1,18 @@
 from jose import jwt, jwk, JWTError
 from fastapi import Cookie, Response, Depends, HTTPException, Header, status, security, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from backend.supabase_client import supabase
-from backend.api.email_service import send_email, send_welcome_email
+from backend.api.email_service import build_welcome_email
+from backend.api.email_outbox import outbox
 from typing import Optional
+from backend.api.http_client import get_client
+from backend.api.cache import TTLCache
+from backend.supabase_services.batch_writer import BatchWriter
+from backend.supabase_services.user_profiles_services import insert_new_profiles, upsert_profiles, get_admin_flag
 import logging
-import httpx
 from dotenv import load_dotenv
+import hashlib
 import os
+import time
 
 load_dotenv()
 
@@ -21,6 +26,27 @@ SUPABASE_AUDIENCE = os.getenv("SUPABASE_AUDIENCE")
 
 jwks_cache = {}
 
+# supabase_id -> email last synced by this process; a different email means the profile changed
+known_profiles = TTLCache(
+    maxsize=int(os.getenv("KNOWN_PROFILES_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("KNOWN_PROFILES_CACHE_TTL", "3600")),
+    name="known_profiles"
+)
+
+# verified claims keyed by token digest, so a dashboard's burst of requests decodes the JWT once
+verified_tokens = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_MAX_TTL", "900")),
+    name="verified_tokens"
+)
+
+# admin flags per supabase_id; a demotion takes effect after the TTL or an explicit invalidate_roles
+admin_roles = TTLCache(
+    maxsize=int(os.getenv("ADMIN_ROLE_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("ADMIN_ROLE_CACHE_TTL", "60")),
+    name="admin_roles"
+)
+
 if not all([SUPABASE_URL, SUPABASE_ISSUER, SUPABASE_SECRET, SUPABASE_AUDIENCE]):
     raise ValueError(
         "Missing environment variables: SUPABASE_URL, SUPABASE_ISSUER, SUPABASE_SECRET, SUPABASE_AUDIENCE"
@@ -31,14 +57,37 @@ security = HTTPBearer()
 async def get_public_keys():
     global jwks_cache
     if not jwks_cache:
-        async with httpx.AsyncClient() as client:
-            headers = {"apikey": SUPABASE_SECRET}
-            resp = await client.get(f"{SUPABASE_URL}/auth/v1/keys")
-            resp.raise_for_status()
-            keys = resp.json()["keys"]
-            jwks_cache = {key["kid"]: key for key in keys}
+        client = get_client("supabase")
+        headers = {"apikey": SUPABASE_SECRET}
+        resp = await client.get("/auth/v1/keys")
+        resp.raise_for_status()
+        keys = resp.json()["keys"]
+        jwks_cache = {key["kid"]: key for key in keys}
     return jwks_cache
 
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def decode_token(token: str) -> dict:
+    digest = _token_digest(token)
+    payload = verified_tokens.get(digest)
+    if payload is None:
+        payload = jwt.decode(
+            token,
+            SUPABASE_SECRET,  # 🔑 HS256 secret
+            algorithms=["HS256"],
+            audience=SUPABASE_AUDIENCE
+            #issuer=SUPABASE_ISSUER
+        )
+        # never outlive the token itself
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            verified_tokens.set(digest, payload, ttl=min(remaining, verified_tokens.ttl))
+    return dict(payload)
+
+def forget_token(token: str):
+    verified_tokens.pop(_token_digest(token))
+
 async def verify_token_flexible(auth_token: str = Cookie(None), authorization: str = Header(None)):
     token = None
 
@@ -51,12 +100,7 @@ async def verify_token_flexible(auth_token: str = Cookie(None), authorization: s
         raise HTTPException(status_code=401, detail="Authentication Required")
 
     try:
-        payload = jwt.decode(
-            token,
-            SUPABASE_SECRET,
-            algorithms=["HS256"],
-            audience=SUPABASE_AUDIENCE
-        )
+        payload = decode_token(token)
         return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid Token")
@@ -67,13 +111,7 @@ async def get_current_user_flexible(token = Depends(verify_token_flexible)):
 async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     token = credentials.credentials
     try:
-        payload = jwt.decode(
-            token,
-            SUPABASE_SECRET,  # 🔑 HS256 secret
-            algorithms=["HS256"],
-            audience=SUPABASE_AUDIENCE
-            #issuer=SUPABASE_ISSUER
-        )
+        payload = decode_token(token)
         return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid Token")
@@ -81,14 +119,26 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Security(secu
 async def get_current_user(token = Depends(verify_token)):
     return token
 
+async def require_admin(user = Depends(get_current_user)):
+    try:
+        # lookup failures aren't cached, so the next request checks again
+        allowed = await admin_roles.get_or_fetch(user["sub"], lambda: get_admin_flag(user["sub"]))
+    except Exception as e:
+        logger.error(f"Error checking if user is admin: {e}")
+        allowed = False
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user
+
+def invalidate_roles(supabase_id: str = None):
+    if supabase_id is None:
+        admin_roles.clear()
+    else:
+        admin_roles.pop(supabase_id)
+
 async def exchange_token_for_cookie(token: str, response: Response):
     try:
-        payload = jwt.decode(
-            token,
-            SUPABASE_SECRET,
-            algorithms=["HS256"],
-            audience=SUPABASE_AUDIENCE
-        )
+        payload = decode_token(token)
         user_id = payload["sub"]
         response.set_cookie(
             key="auth_token",
@@ -109,26 +159,55 @@ async def exchange_token_for_cookie(token: str, response: Response):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def sync_user_profile(user: dict):
+async def sync_user_profile(user: dict):
+    # repeat calls are free; a user this process hasn't seen is written before returning so
+    # callers can rely on the row, while an email change for a known user is written behind
     supabase_id = user["sub"]
     email = user.get("email")
     if not email:
         return
-    existing_user = supabase.table("user_profiles").select("*").eq("supabase_id", supabase_id).execute()
-    is_new_user = len(existing_user.data) == 0
-
-    supabase.table("user_profiles").upsert({
-        "supabase_id": supabase_id,
-        "email": email
-    }, on_conflict="supabase_id").execute()
-
-    if is_new_user:
-        try:
-            username = email.split("@")[0].title() if email else "User"
-            status_code, response = send_welcome_email(email, username)
-            if status_code == 200:
-                logger.info(f"Welcome email sent to {email}")
-            else:
-                logger.error(f"Failed to send welcome email to {email}: {response}")
-        except Exception as e:
-            logger.error(f"Error sending welcome email to {email}: {e}")
+    known_email = known_profiles.get(supabase_id)
+    if known_email == email:
+        return
+    profile = {"supabase_id": supabase_id, "email": email}
+    if known_email is None:
+        await write_profiles([profile])
+        known_profiles.set(supabase_id, email)
+        return
+    known_profiles.set(supabase_id, email)
+    await profile_writer.add(profile)
+
+async def write_profiles(profiles: list):
+    # the same user can be queued twice before a flush, and one upsert can't touch a row twice
+    profiles = list({profile["supabase_id"]: profile for profile in profiles}.values())
+    try:
+        created = await insert_new_profiles(profiles)
+        # queued first so a failing upsert below can't cost the new users their welcome email
+        for row in created:
+            send_welcome_email(row["email"])
+        created_ids = {row["supabase_id"] for row in created}
+        await upsert_profiles([profile for profile in profiles if profile["supabase_id"] not in created_ids])
+    except Exception:
+        for profile in profiles:
+            known_profiles.pop(profile["supabase_id"])
+        raise
+
+async def write_profile(profile: dict):
+    await write_profiles([profile])
+
+profile_writer = BatchWriter("user_profiles", write_profiles, write_profile)
+
+def send_welcome_email(email: str):
+    try:
+        username = email.split("@")[0].title() if email else "User"
+        future = outbox.submit(email, *build_welcome_email(username))
+        future.add_done_callback(lambda done: _log_welcome_email(email, done))
+    except Exception as e:
+        logger.error(f"Error sending welcome email to {email}: {e}")
+
+def _log_welcome_email(email: str, future):
+    status_code, response = future.result()
+    if status_code == 200:
+        logger.info(f"Welcome email sent to {email}")
+    else:
+        logger.error(f"Failed to send welcome email to {email}: {response}")
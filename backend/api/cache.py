@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+_registry = []
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        _registry.append(self)
+
+    def get(self, key, default=None, count_miss: bool = True):
+        # count_miss=False is for a pre-check ahead of get_or_fetch, which counts the miss itself
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            if count_miss:
+                self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        # like get, but leaves the LRU order and hit/miss counters alone
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    async def get_or_fetch(self, key, fetch, ttl: float = None):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        # single-flight: concurrent misses for the same key wait on the first caller's fetch
+        loop = asyncio.get_running_loop()
+        pending = self._inflight.get(key)
+        while pending is not None and pending.get_loop() is loop:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # only the leader was cancelled, so this caller takes over the fetch
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            value = self.get(key, _MISSING, count_miss=False)
+            if value is not _MISSING:
+                return value
+            pending = self._inflight.get(key)
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # retrieve it so an un-awaited failure doesn't log "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+def cache_stats() -> list:
+    return [cache.stats() for cache in _registry]
@@ -0,0 +1,154 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from backend.api.email_service import build_message, mailjet
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "mailjet")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))  # Mailjet v3.1 accepts up to 50 messages per call
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "3"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "1"))
+
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+class MailjetTransport:
+    def send(self, messages: list) -> list:
+        result = mailjet.send.create(data={"Messages": messages})
+        try:
+            body = result.json()
+        except ValueError:
+            body = {}
+        statuses = body.get("Messages") if isinstance(body, dict) else None
+        if not statuses or len(statuses) != len(messages):
+            # no per-message report, so the whole batch shares the call's outcome
+            return [(result.status_code, body)] * len(messages)
+        return [(200 if status.get("Status") == "success" else result.status_code, status) for status in statuses]
+
+class StubTransport:
+    # stands in for Mailjet when load-testing the outbox offline
+    def __init__(self, latency: float = None, failure_rate: float = None):
+        self.latency = float(os.getenv("EMAIL_STUB_LATENCY", "0.05")) if latency is None else latency
+        self.failure_rate = float(os.getenv("EMAIL_STUB_FAILURE_RATE", "0")) if failure_rate is None else failure_rate
+        self.calls = 0
+        self.delivered = []
+
+    def send(self, messages: list) -> list:
+        self.calls += 1
+        time.sleep(self.latency)
+        results = []
+        for message in messages:
+            if random.random() < self.failure_rate:
+                results.append((503, {"Status": "error", "To": message["To"]}))
+            else:
+                self.delivered.append(message)
+                results.append((200, {"Status": "success", "To": message["To"]}))
+        return results
+
+class _OutboxItem:
+    def __init__(self, message: dict):
+        self.message = message
+        self.future = Future()
+
+class EmailOutbox:
+    def __init__(self, transport, workers: int = EMAIL_WORKERS, batch_size: int = EMAIL_BATCH_SIZE,
+                 max_retries: int = EMAIL_MAX_RETRIES, retry_backoff: float = EMAIL_RETRY_BACKOFF):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run_worker, name=f"email-outbox-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Email outbox started with {self.workers} workers ({type(self.transport).__name__}).")
+
+    def stop(self, timeout: float = 10):
+        # workers drain whatever is already queued before exiting
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, to_email: str, subject: str, text: str, html: str = "") -> Future:
+        # resolves to (status, response) like send_email, once Mailjet has accepted or rejected the message
+        self.start()
+        item = _OutboxItem(build_message(to_email, subject, text, html))
+        self._queue.put(item)
+        return item.future
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+        }
+
+    def _run_worker(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._deliver(batch)
+
+    def _deliver(self, batch: list):
+        pending = batch
+        attempt = 0
+        while pending:
+            self.batches += 1
+            try:
+                results = self.transport.send([item.message for item in pending])
+            except Exception as e:
+                logger.warning(f"Email batch of {len(pending)} failed to send: {e}")
+                results = [(503, {"error": str(e)})] * len(pending)
+
+            retry = []
+            for item, (status, response) in zip(pending, results):
+                if status == 200:
+                    self.sent += 1
+                    item.future.set_result((status, response))
+                elif status in TRANSIENT_STATUSES and attempt < self.max_retries:
+                    retry.append(item)
+                else:
+                    self.failed += 1
+                    item.future.set_result((status, response))
+
+            if retry:
+                attempt += 1
+                self.retried += len(retry)
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+                time.sleep(delay + random.uniform(0, delay))
+            pending = retry
+
+def _default_transport():
+    return StubTransport() if EMAIL_TRANSPORT == "stub" else MailjetTransport()
+
+outbox = EmailOutbox(_default_transport())
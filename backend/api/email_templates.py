@@ -0,0 +1,158 @@
+from functools import lru_cache
+from html import escape
+
+class Layout:
+    # the layout is split around its slot once, so rendering is a single join
+    def __init__(self, source: str, slot: str = "{{ body }}"):
+        self.head, self.tail = source.split(slot)
+
+    def render(self, parts) -> str:
+        return "".join((self.head, *parts, self.tail))
+
+ALERT_LAYOUT = Layout("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <style>
+        body { font-family: Arial, sans-serif; background-color: #f9fafb; color: #1f2937; margin: 0; padding: 20px; }
+        .container { max-width: 600px; margin: 0 auto; background-color: #0f172a; padding: 20px; border-radius: 8px; }
+        .header { text-align: center; margin-bottom: 20px; }
+        .game-item { background-color: #1e293b; padding: 15px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #3b82f6; }
+        .game-name { font-size: 18px; font-weight: bold; color: #ffffff; }
+        .discount { color: #3b82f6; font-size: 16px; margin-top: 5px; }
+        .footer { text-align: center; margin-top: 20px; font-size: 12px; color: #9ca3af; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h2 style="color: #3b82f6; margin: 0;">SteamPriceTracker Alert</h2>
+        </div>
+        <div class="content">
+{{ body }}
+        </div>
+        <div class="footer">
+            <p>Visit Steam to grab these deals before they expire!</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+DISCOUNT_ROW = """            <div class="game-item">
+                <div class="game-name">{name}</div>
+                <div class="discount">
+                    <span style="color: #6b7280; text-decoration: line-through;">${original_price:.2f}</span>
+                    <span style="color: #3b82f6; font-weight: 600;"> ${current_price:.2f}</span>
+                    <span style="color: #dc2626; font-weight: 600;"> -{discount_percent}%</span>
+                </div>
+            </div>
+""".format
+
+PRICE_DROP_ROW = """            <div class="game-item">
+                <div class="game-name">{name}</div>
+                <div class="discount">Price dropped to ${current_price:.2f}{was}</div>
+            </div>
+""".format
+
+WELCOME_LAYOUT = Layout("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <style>
+        body { font-family: Arial, sans-serif; background-color: #f9fafb; color: #1f2937; margin: 0; padding: 20px; }
+        .container { max-width: 600px; margin: 0 auto; background-color: #0f172a; padding: 20px; border-radius: 8px; }
+        .header { text-align: center; margin-bottom: 20px; }
+        .welcome-content { background-color: #1e293b; padding: 20px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #3b82f6; }
+        .feature-item { background-color: #1e293b; padding: 15px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #3b82f6; }
+        .feature-title { font-size: 16px; font-weight: bold; color: #ffffff; margin-bottom: 5px; }
+        .feature-desc { color: #9ca3af; font-size: 14px; }
+        .cta-button { display: inline-block; background-color: #3b82f6; color: #ffffff; padding: 12px 24px; text-decoration: none; border-radius: 5px; margin: 20px 0; font-weight: bold; }
+        .footer { text-align: center; margin-top: 20px; font-size: 12px; color: #9ca3af; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h2 style="color: #3b82f6; margin: 0;">Welcome to SteamPriceTracker!</h2>
+        </div>
+        <div class="content">
+            <div class="welcome-content">
+                <div class="feature-title">Hi {{ body }},</div>
+                <div class="feature-desc" style="color: #ffffff; margin-top: 10px;">
+                    We're excited to have you onboard with our community of smart Steam shoppers!
+                    Start saving money on your favorite games today.
+                </div>
+            </div>
+
+            <div class="feature-item">
+                <div class="feature-title">Track Game Prices</div>
+                <div class="feature-desc">Add games to your watchlist and monitor price changes over time with detailed charts.</div>
+            </div>
+
+            <div class="feature-item">
+                <div class="feature-title">🔔 Custom Price Alerts</div>
+                <div class="feature-desc">Set alerts for percentage discounts or specific price drops - we'll email you when deals go live!</div>
+            </div>
+
+            <div class="feature-item">
+                <div class="feature-title">Price History Charts</div>
+                <div class="feature-desc">View detailed price history to find the best time to buy and never overpay again.</div>
+            </div>
+
+            <div style="text-align: center;">
+                <a href="https://steampricetracker.com/search" class="cta-button">Start Tracking Games</a>
+            </div>
+        </div>
+        <div class="footer">
+            <p>© 2025 SteamPriceTracker.</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+WELCOME_TEXT = Layout("""
+Hi {{ body }},
+Welcome to SteamPriceTracker! We're excited to have you onboard.
+
+With your account, you can:
+• Track Steam game prices and get notified of deals
+• Set custom price alerts for your favorite games
+• View detailed price history charts
+• Never miss a sale again!
+
+Start by searching for games and adding them to your watchlist.
+
+Happy tracking!
+The SteamPriceTracker Team
+""")
+
+# during an alert burst the same game row shows up in thousands of emails, so rows are rendered once
+@lru_cache(maxsize=4096)
+def render_alert_row(alert_type: str, name: str, current_price: float, discount_percent: int, old_price: float = None):
+    safe_name = escape(name)
+    if alert_type == "percentage_discount":
+        original_price = current_price / (1 - discount_percent / 100)
+        html = DISCOUNT_ROW(name=safe_name, original_price=original_price, current_price=current_price, discount_percent=discount_percent)
+    else:
+        was = f" (was ${old_price:.2f})" if old_price else ""
+        html = PRICE_DROP_ROW(name=safe_name, current_price=current_price, was=was)
+    text = f"{name}: {discount_percent}% OFF on Steam!"
+    return html, text
+
+def render_alert_email(rows: list):
+    # rows are (alert_type, name, current_price, discount_percent, old_price) tuples
+    if len(rows) == 1:
+        subject = f"Price alert: {rows[0][1]} is on sale!"
+    else:
+        subject = f"Price alert: {len(rows)} games are on sale!"
+
+    rendered = [render_alert_row(*row) for row in rows]
+    html = ALERT_LAYOUT.render(html for html, _ in rendered)
+    text = "\n".join(text for _, text in rendered)
+    return subject, text, html
+
+def render_welcome_email(username: str = "User"):
+    subject = "Welcome to SteamPriceTracker!"
+    return subject, WELCOME_TEXT.render((username,)), WELCOME_LAYOUT.render((escape(username),))
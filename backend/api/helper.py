@@ -6,18 +6,32 @@ import httpx
 from datetime import datetime
 import asyncio
 from backend.supabase_services.game_services import search_games_in_db
+from backend.api.http_client import get_client
+from backend.api.cache import TTLCache
+from backend.api.rate_limiter import limiters
+from backend.api.search_index import search_index, is_strong_match
 
 load_dotenv()
 
 RAWG_API_KEY = os.getenv("RAWG_API_KEY")
-async def get_game_data(app_id: int):
-    url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&cc=us&l=en"
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            resp = await client.get(url)
-        except httpx.RequestError:
-            raise HTTPException(status_code=502, detail="Failed to reach Steam API.")
+appdetails_cache = TTLCache(
+    maxsize=int(os.getenv("APPDETAILS_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("APPDETAILS_CACHE_TTL", "300")),
+    name="appdetails"
+)
+
+async def get_game_data(app_id: int, region: str = "us"):
+    return await appdetails_cache.get_or_fetch((app_id, region), lambda: fetch_game_data(app_id, region))
+
+async def fetch_game_data(app_id: int, region: str = "us"):
+    client = get_client("steam")
+    try:
+        resp = await limiters["appdetails"].request(
+            lambda: client.get("/api/appdetails", params={"appids": app_id, "cc": region, "l": "en"})
+        )
+    except httpx.RequestError:
+        raise HTTPException(status_code=502, detail="Failed to reach Steam API.")
     if resp.status_code != 200:
         raise HTTPException(status_code=502, detail="Steam API returned an error.")
 
@@ -28,50 +42,99 @@ async def get_game_data(app_id: int):
         raise HTTPException(status_code=404, detail="Game not found.")
     return app_data
 
+store_search_cache = TTLCache(
+    maxsize=int(os.getenv("STORESEARCH_CACHE_SIZE", "2000")),
+    ttl=float(os.getenv("STORESEARCH_CACHE_TTL", "600")),
+    name="storesearch"
+)
+STORESEARCH_NEGATIVE_TTL = float(os.getenv("STORESEARCH_NEGATIVE_TTL", "120"))
+STORESEARCH_MAX_RESULTS = 10  # storesearch returns at most this many items, so a shorter list is the full answer
+MIN_PREFIX_LENGTH = 3
+
+def normalize_search_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def _matches_query(name: str, query: str) -> bool:
+    name = name.lower()
+    return all(token in name for token in query.split())
+
+def _refine_from_prefix(query: str):
+    # autocomplete sends "portal" then "portal 2": a complete answer for a prefix already holds every refinement
+    for end in range(len(query) - 1, MIN_PREFIX_LENGTH - 1, -1):
+        cached = store_search_cache.peek(query[:end])
+        if cached is None:
+            continue
+        if len(cached) >= STORESEARCH_MAX_RESULTS:
+            return None
+        return [game for game in cached if _matches_query(game["name"], query)]
+    return None
+
 async def search_steam_api(query: str, limit: int = 10): # for games not in database, used in search
+    normalized = normalize_search_query(query)
+    if not normalized:
+        return []
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get("https://store.steampowered.com/api/storesearch/", params={"term": query, "cc": "us", "l": "en"})
-            if resp.status_code == 200:
-                data = resp.json()
-                items = data.get("items", [])
-
-                results = []
-                for item in items[:limit]:
-                    price_info = None
-                    currency = "USD"
-                    discount_percent = 0
-
-                    if "price" in item and item["price"]:
-                        initial_price = item["price"].get("initial", 0)
-                        final_price = item["price"].get("final", 0)
-
-                        price_info = final_price / 100 if final_price else None
-                        currency = item["price"].get("currency", "USD")
-
-                        if initial_price and final_price and initial_price > final_price:
-                            discount_percent = int(((initial_price - final_price) / initial_price) * 100)
-
-                    results.append({
-                        "app_id": item["id"],
-                        "name": item["name"],
-                        "current_price": price_info,
-                        "currency": currency,
-                        "discount_percent": discount_percent,
-                        "is_free": price_info == 0 if price_info is not None else None,
-                        "image": item.get("tiny_image", "")
-                    })
-                return results
+        results = store_search_cache.get(normalized, count_miss=False)
+        if results is None:
+            results = _refine_from_prefix(normalized)
+            if results is not None:
+                store_search_cache.set(normalized, results, ttl=STORESEARCH_NEGATIVE_TTL if not results else None)
+        if results is None:
+            results = await store_search_cache.get_or_fetch(normalized, lambda: fetch_store_search(normalized))
+            if not results:
+                # negative entries expire sooner so newly listed games show up
+                store_search_cache.set(normalized, results, ttl=STORESEARCH_NEGATIVE_TTL)
+        return results[:limit]
     except Exception as e:
-                print(f"Steam store Search failed: {e}")
-                return []
-    return []
+        print(f"Steam store Search failed: {e}")
+        return []
+
+async def fetch_store_search(query: str):
+    client = get_client("steam")
+    resp = await limiters["storesearch"].request(
+        lambda: client.get("/api/storesearch/", params={"term": query, "cc": "us", "l": "en"})
+    )
+    if resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="Steam store search returned an error.")
+
+    data = resp.json()
+    items = data.get("items", [])
+
+    results = []
+    for item in items:
+        price_info = None
+        currency = "USD"
+        discount_percent = 0
+
+        if "price" in item and item["price"]:
+            initial_price = item["price"].get("initial", 0)
+            final_price = item["price"].get("final", 0)
+
+            price_info = final_price / 100 if final_price else None
+            currency = item["price"].get("currency", "USD")
+
+            if initial_price and final_price and initial_price > final_price:
+                discount_percent = int(((initial_price - final_price) / initial_price) * 100)
+
+        results.append({
+            "app_id": item["id"],
+            "name": item["name"],
+            "current_price": price_info,
+            "currency": currency,
+            "discount_percent": discount_percent,
+            "is_free": price_info == 0 if price_info is not None else None,
+            "image": item.get("tiny_image", "")
+        })
+    return results
 
 async def search_games_fallback(query: str, limit: int = 10):
     results = []
 
-    print(f"Searching database for: {query}")
-    db_games = search_games_in_db(query, limit)
+    if search_index.ready:
+        db_games = search_index.search(query, limit)
+    else:
+        print(f"Searching database for: {query}")
+        db_games = await search_games_in_db(query, limit)
 
     for game in db_games:
         results.append({
@@ -86,7 +149,10 @@ async def search_games_fallback(query: str, limit: int = 10):
 
     print(f"Found {len(results)} games in db.")
 
-    if len(results) < limit:
+    # a short list still goes to Steam unless the index found the title itself; fuzzy near-misses don't count
+    strong_hit = search_index.ready and any(is_strong_match(query, game["name"]) for game in results)
+    needs_steam = len(results) < limit and not strong_hit
+    if needs_steam:
         remaining = limit - len(results)
         print(f"Searching steam store for {remaining} more games...")
 
@@ -102,67 +168,68 @@ async def search_games_fallback(query: str, limit: int = 10):
 
 async def get_popular_games_from_steam(limit: int = 10):
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get("https://store.steampowered.com/api/featuredcategories/")
-            data = response.json()
-
-            print(f"DEBUG: Steam API status code: {response.status_code}")
-
-            top_sellers = data.get('top_sellers', {}).get('items', [])
-            print(f"DEBUG: Found {len(top_sellers)} top sellers from Steam")
-
-            games = []
-            for item in top_sellers:
-                if not item.get('large_capsule_image'):
-                    print(f"DEBUG: Processing game: {item.get('name')} (ID: {item['id']})")
-                    continue
-
-                if item['id'] == 1675200:
-                    print(f"DEBUG: Skipping Steam Deck")
-                    continue
-
-
-                if 'steam deck' in item.get('name', '').lower():
-                    print(f"DEBUG: Skipping game with 'steam deck' in name")
-                    continue
-
-                games.append({
-                    'app_id': item['id'],
-                    'name': item['name'],
-                    'current_price': item.get('final_price', 0) / 100,
-                    'original_price': item.get('original_price', 0) / 100,
-                    'discount_percent': item.get('discount_percent', 0),
-                    'currency': 'USD',
-                    'header_image': item.get('large_capsule_image', ''),
-                    'is_free': item.get('final_price', 0) == 0
-                })
-
-                  # Stop once we have enough games
-                if len(games) >= limit:
-                    break
+        client = get_client("steam")
+        response = await limiters["featuredcategories"].request(lambda: client.get("/api/featuredcategories/"))
+        data = response.json()
+
+        print(f"DEBUG: Steam API status code: {response.status_code}")
+
+        top_sellers = data.get('top_sellers', {}).get('items', [])
+        print(f"DEBUG: Found {len(top_sellers)} top sellers from Steam")
+
+        games = []
+        for item in top_sellers:
+            if not item.get('large_capsule_image'):
+                print(f"DEBUG: Processing game: {item.get('name')} (ID: {item['id']})")
+                continue
+
+            if item['id'] == 1675200:
+                print(f"DEBUG: Skipping Steam Deck")
+                continue
+
+
+            if 'steam deck' in item.get('name', '').lower():
+                print(f"DEBUG: Skipping game with 'steam deck' in name")
+                continue
+
+            games.append({
+                'app_id': item['id'],
+                'name': item['name'],
+                'current_price': item.get('final_price', 0) / 100,
+                'original_price': item.get('original_price', 0) / 100,
+                'discount_percent': item.get('discount_percent', 0),
+                'currency': 'USD',
+                'header_image': item.get('large_capsule_image', ''),
+                'is_free': item.get('final_price', 0) == 0
+            })
+
+              # Stop once we have enough games
+            if len(games) >= limit:
+                break
                 
-            async def fetch_accurate_price(game):
-                try:
-                    url = f"https://store.steampowered.com/api/appdetails?appids={game['app_id']}&cc=us&l=en"
-                    resp = await client.get(url)
-                    if resp.status_code == 200:
-                        app_data = resp.json().get(str(game['app_id']), {})
-                        if app_data.get('success'):
-                            price_overview = app_data['data'].get('price_overview')
-                            if price_overview:
-                                game['current_price'] = price_overview['final'] / 100
-                                game['original_price'] = price_overview['initial'] / 100
-                                game['discount_percent'] = price_overview.get('discount_percent', 0)
-                            elif app_data['data'].get('is_free'):
-                                game['current_price'] = 0
-                                game['original_price'] = 0
-                                game['is_free'] = True
-                except Exception as e:
-                    print(f"Failed to fetch price for {game['name']}: {e}")
-            await asyncio.gather(*[fetch_accurate_price(g) for g in games])
+        async def fetch_accurate_price(game):
+            try:
+                resp = await limiters["appdetails"].request(
+                    lambda: client.get("/api/appdetails", params={"appids": game['app_id'], "cc": "us", "l": "en"})
+                )
+                if resp.status_code == 200:
+                    app_data = resp.json().get(str(game['app_id']), {})
+                    if app_data.get('success'):
+                        price_overview = app_data['data'].get('price_overview')
+                        if price_overview:
+                            game['current_price'] = price_overview['final'] / 100
+                            game['original_price'] = price_overview['initial'] / 100
+                            game['discount_percent'] = price_overview.get('discount_percent', 0)
+                        elif app_data['data'].get('is_free'):
+                            game['current_price'] = 0
+                            game['original_price'] = 0
+                            game['is_free'] = True
+            except Exception as e:
+                print(f"Failed to fetch price for {game['name']}: {e}")
+        await asyncio.gather(*[fetch_accurate_price(g) for g in games])
                 
-            print(f"DEBUG: Returning {len(games)} games")
-            return games
+        print(f"DEBUG: Returning {len(games)} games")
+        return games
 
     except Exception as e:
         print(f"Error fetching Steam top sellers: {e}")
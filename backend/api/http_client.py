@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+import weakref
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# one pooled client per upstream host, each with its own timeout
+UPSTREAMS = {
+    "steam": {
+        "base_url": "https://store.steampowered.com",
+        "timeout": float(os.getenv("STEAM_HTTP_TIMEOUT", "10")),
+    },
+    "turnstile": {
+        "base_url": "https://challenges.cloudflare.com",
+        "timeout": float(os.getenv("TURNSTILE_HTTP_TIMEOUT", "10")),
+    },
+    "supabase": {
+        "base_url": os.getenv("SUPABASE_URL") or "",
+        "timeout": float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10")),
+    },
+}
+
+# httpx connections are bound to the event loop that opened them, so clients are kept per loop
+_clients = weakref.WeakKeyDictionary()
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    config = UPSTREAMS[name]
+    return httpx.AsyncClient(
+        base_url=config["base_url"],
+        timeout=httpx.Timeout(config["timeout"]),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=HTTP2_AVAILABLE,
+    )
+
+def get_client(name: str) -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    client = clients.get(name)
+    if client is None or client.is_closed:
+        client = _build_client(name)
+        clients[name] = client
+    return client
+
+async def open_clients():
+    for name in UPSTREAMS:
+        get_client(name)
+    logger.info(f"HTTP clients ready for {', '.join(UPSTREAMS)} (http2={HTTP2_AVAILABLE}).")
+
+async def close_clients():
+    loop = asyncio.get_running_loop()
+    clients = _clients.pop(loop, {})
+    for client in clients.values():
+        await client.aclose()
@@ -0,0 +1,150 @@
+from backend.supabase_client import supabase
+from backend.supabase_services.db import run_query, fetch_pages
+from backend.api.cache import TTLCache
+from fastapi import HTTPException
+import base64
+import binascii
+import bisect
+import json
+import os
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200  # also keeps page lookups within one in_() chunk
+
+# a sorted walk scans its keys on the first page; later cursors for the same query slice the cached list
+sorted_key_cache = TTLCache(
+    maxsize=int(os.getenv("SORTED_KEY_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("SORTED_KEY_CACHE_TTL", "300")),
+    name="sorted_keys"
+)
+
+SORTS = ("default", "discount", "price", "name")
+
+def page_size(limit: int = None) -> int:
+    # the server picks the page size; clients can only ask for smaller pages
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(sort: str, key: list) -> str:
+    raw = json.dumps({"s": sort, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if not isinstance(data, dict) or data.get("s") != sort or not isinstance(data.get("k"), list):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort.")
+    return data["k"]
+
+def validate_sort(sort: str) -> str:
+    if sort not in SORTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort '{sort}'. Use one of: {', '.join(SORTS)}.")
+    return sort
+
+def sort_key(sort: str, game: dict, row_id) -> list:
+    # every key ends with the row's unique id so ties still give a total order
+    game = game or {}
+    if sort == "discount":
+        return [-(game.get("discount_percent") or 0), row_id]
+    if sort == "price":
+        price = game.get("last_known_price")
+        return [price is None, price or 0, row_id]
+    if sort == "name":
+        return [(game.get("name") or "").casefold(), row_id]
+    return [row_id]
+
+class KeysetQuery:
+    # pages a user's rows from one table; "default" is a true keyset on id_field, the other
+    # sorts scan just the sort columns once per walk, order them here and load each page by id
+    def __init__(self, table: str, fields: str, key_fields: str, id_field: str, filters: dict):
+        self.table = table
+        self.fields = fields
+        self.key_fields = key_fields
+        self.id_field = id_field
+        self.filters = filters
+
+    def _query(self, fields: str):
+        query = supabase.table(self.table).select(fields)
+        for column, value in self.filters.items():
+            query = query.eq(column, value)
+        return query
+
+    def _default_page(self, after: list, limit: int):
+        query = self._query(self.fields)
+        if after is not None:
+            query = query.gt(self.id_field, after[0])
+        rows = query.order(self.id_field).limit(limit + 1).execute().data or []
+        next_cursor = encode_cursor("default", [rows[limit - 1][self.id_field]]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def sorted_keys(self, sort: str) -> list:
+        keyed = []
+        for rows in fetch_pages(lambda: self._query(self.key_fields).order(self.id_field)):
+            keyed.extend((sort_key(sort, row.get("games"), row[self.id_field]), row[self.id_field]) for row in rows)
+        keyed.sort(key=lambda pair: pair[0])
+        return keyed
+
+    def _load(self, ids: list) -> list:
+        if not ids:
+            return []
+        rows = self._query(self.fields).in_(self.id_field, ids).execute().data or []
+        by_id = {row[self.id_field]: row for row in rows}
+        return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+    def _cached_keys(self, sort: str, after: list) -> list:
+        # a first page always rescans, so a fresh walk sees rows added since the last one
+        cache_key = (self.table, tuple(sorted(self.filters.items())), sort)
+        keyed = sorted_key_cache.get(cache_key) if after is not None else None
+        if keyed is None:
+            keyed = self.sorted_keys(sort)
+            sorted_key_cache.set(cache_key, keyed)
+        return keyed
+
+    def _slice(self, keyed: list, sort: str, after: list, limit: int):
+        if after is not None:
+            try:
+                keyed = keyed[bisect.bisect_right(keyed, after, key=lambda pair: pair[0]):]
+            except TypeError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+        page = keyed[:limit]
+        next_cursor = encode_cursor(sort, page[-1][0]) if len(keyed) > limit else None
+        return self._load([row_id for _, row_id in page]), next_cursor, keyed[limit:]
+
+    def page(self, sort: str, after: list, limit: int):
+        if sort == "default":
+            return self._default_page(after, limit)
+        rows, next_cursor, _ = self._slice(self._cached_keys(sort, after), sort, after, limit)
+        return rows, next_cursor
+
+    def pages(self, sort: str, after: list, limit: int):
+        # sorted streams reuse one key scan for every page
+        if sort == "default":
+            while True:
+                rows, next_cursor = self._default_page(after, limit)
+                yield rows
+                if not next_cursor:
+                    return
+                after = [rows[-1][self.id_field]]
+        keyed = self.sorted_keys(sort)
+        while True:
+            rows, next_cursor, keyed = self._slice(keyed, sort, after, limit)
+            yield rows
+            if not next_cursor:
+                return
+            after = None
+
+async def stream_ndjson(pages):
+    # pulls one page at a time off the worker thread, so memory stays bounded by the page size
+    done = object()
+    while True:
+        rows = await run_query(next, pages, done, name="pagination.stream_page")
+        if rows is done:
+            return
+        for row in rows:
+            yield json.dumps(row, default=str) + "\n"
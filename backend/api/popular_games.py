@@ -0,0 +1,81 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from backend.api.helper import get_popular_games_from_steam
+from backend.api.rate_limiter import request_priority, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+POPULAR_GAMES_REFRESH_SECONDS = float(os.getenv("POPULAR_GAMES_REFRESH_SECONDS", "300"))
+POPULAR_GAMES_SNAPSHOT_SIZE = int(os.getenv("POPULAR_GAMES_SNAPSHOT_SIZE", "10"))
+
+class PopularGamesSnapshot:
+    def __init__(self, size: int = POPULAR_GAMES_SNAPSHOT_SIZE, refresh_seconds: float = POPULAR_GAMES_REFRESH_SECONDS):
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self.games = []
+        self.refreshed_at = None
+        self._payloads = {}  # limit -> serialized response body
+        self._refresh_task = None
+        self._loop_task = None
+
+    @property
+    def is_stale(self) -> bool:
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.refresh_seconds * 2
+
+    async def _refresh(self):
+        try:
+            games = await get_popular_games_from_steam(self.size)
+        except Exception as e:
+            # keep serving the last good snapshot while Steam is slow or down
+            logger.error(f"Popular games refresh failed, serving previous snapshot: {e}")
+            return
+        if not games:
+            # an odd 200 body or a final 429 comes back as no top sellers; that isn't a better snapshot
+            logger.error("Popular games refresh returned no games, serving previous snapshot.")
+            return
+        self.games = games
+        self._payloads = {}
+        self.refreshed_at = time.monotonic()
+        logger.info(f"Popular games snapshot refreshed with {len(games)} games.")
+
+    def refresh(self):
+        # concurrent callers share one in-flight refresh
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def _refresh_forever(self):
+        # scheduled refreshes queue behind interactive Steam calls; the task has its own context, so requests keep theirs
+        request_priority.set(BACKGROUND)
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._refresh_forever())
+
+    def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+    async def get_payload(self, limit: int = 10) -> bytes:
+        if not self.games:
+            await asyncio.shield(self.refresh())
+            if not self.games:
+                raise RuntimeError("No popular games snapshot available yet.")
+        elif self.is_stale:
+            self.refresh()
+
+        limit = max(1, min(limit, self.size))
+        payload = self._payloads.get(limit)
+        if payload is None:
+            payload = json.dumps({"games": self.games[:limit]}).encode()
+            self._payloads[limit] = payload
+        return payload
+
+popular_games_snapshot = PopularGamesSnapshot()
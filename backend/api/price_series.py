@@ -0,0 +1,65 @@
+from datetime import datetime
+
+def _epoch(row: dict) -> float:
+    return datetime.fromisoformat(row["timestamp"]).timestamp()
+
+def compress_steps(rows: list) -> list:
+    # prices are a step function, so rows repeating the previous price and discount add nothing to the chart
+    kept = []
+    for row in rows:
+        if kept and row["final_price"] == kept[-1]["final_price"] and row["discount_percent"] == kept[-1]["discount_percent"]:
+            continue
+        kept.append(row)
+    return kept
+
+def lttb(rows: list, threshold: int) -> list:
+    # Largest-Triangle-Three-Buckets over (timestamp, final_price); keeps the first and last points
+    if threshold >= len(rows) or threshold < 3:
+        return rows
+
+    xs = [_epoch(row) for row in rows]
+    ys = [float(row["final_price"]) for row in rows]
+    sampled = [rows[0]]
+    bucket_size = (len(rows) - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, len(rows))
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(rows[best])
+        a = best
+
+    sampled.append(rows[-1])
+    return sampled
+
+def summarize(rows: list, until: datetime = None) -> dict:
+    if not rows:
+        return {"min": None, "max": None, "avg": None, "count": 0}
+
+    prices = [float(row["final_price"]) for row in rows]
+    # time-weighted: each price counts for as long as it was the current one
+    end = until.timestamp() if until else datetime.now().astimezone().timestamp()
+    times = [_epoch(row) for row in rows] + [max(end, _epoch(rows[-1]))]
+    durations = [times[i + 1] - times[i] for i in range(len(rows))]
+    total = sum(durations)
+    avg = sum(p * d for p, d in zip(prices, durations)) / total if total > 0 else sum(prices) / len(prices)
+
+    return {
+        "min": min(prices),
+        "max": max(prices),
+        "avg": round(avg, 2),
+        "count": len(rows),
+    }
+
+def downsample(rows: list, points: int) -> list:
+    return lttb(compress_steps(rows), points)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# background work (the price sync) sets this so user-facing requests get the tokens first
+request_priority = ContextVar("request_priority", default=INTERACTIVE)
+
+RETRY_STATUSES = {429, 503}
+
+def parse_retry_after(value: str):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: int, max_retries: int = 3,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0  # set from Retry-After so every caller pauses, not just the one that got the 429
+        self.waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.requests = 0
+        self.queued = 0
+        self.throttled = 0
+        self.retried = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, priority: str = None):
+        priority = priority or request_priority.get()
+        started = time.monotonic()
+        queued = False
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                yields_to_interactive = priority == BACKGROUND and self.waiting[INTERACTIVE] > 0
+                if self.tokens >= 1 and now >= self.blocked_until and not yields_to_interactive:
+                    self.tokens -= 1
+                    return
+                if not queued:
+                    queued = True
+                    self.queued += 1
+                    self.waiting[priority] += 1
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.01)
+                await asyncio.sleep(delay)
+        finally:
+            if queued:
+                self.waiting[priority] -= 1
+                self.wait_seconds += time.monotonic() - started
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def request(self, send):
+        # send is a zero-arg coroutine function returning an httpx.Response
+        attempt = 0
+        while True:
+            await self.acquire()
+            self.requests += 1
+            response = await send()
+            if response.status_code not in RETRY_STATUSES:
+                return response
+
+            self.throttled += 1
+            delay = self.backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            if attempt >= self.max_retries:
+                logger.warning(f"{self.name}: still throttled after {attempt} retries, giving up.")
+                return response
+            attempt += 1
+            self.retried += 1
+            logger.warning(f"{self.name}: got {response.status_code}, retry {attempt} in {delay:.1f}s.")
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "waiting": dict(self.waiting),
+            "requests": self.requests,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "retried": self.retried,
+            "wait_seconds": round(self.wait_seconds, 2),
+        }
+
+def _bucket(name: str, env_prefix: str, rate: float, burst: int):
+    return TokenBucket(
+        name,
+        rate=float(os.getenv(f"{env_prefix}_RATE", str(rate))),
+        burst=int(os.getenv(f"{env_prefix}_BURST", str(burst))),
+    )
+
+# one bucket per Steam endpoint; appdetails is documented around 200 calls per 5 minutes
+limiters = {
+    "appdetails": _bucket("steam:appdetails", "STEAM_APPDETAILS", rate=0.66, burst=10),
+    "storesearch": _bucket("steam:storesearch", "STEAM_STORESEARCH", rate=2, burst=10),
+    "featuredcategories": _bucket("steam:featuredcategories", "STEAM_FEATURED", rate=0.5, burst=5),
+}
+
+def limiter_stats() -> list:
+    return [limiter.stats() for limiter in limiters.values()]
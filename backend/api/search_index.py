@@ -0,0 +1,120 @@
+from backend.supabase_client import supabase
+from backend.supabase_services.db import fetch_pages
+from collections import defaultdict
+import heapq
+import math
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MIN_COVERAGE = 0.5  # share of the query's trigrams a name must contain to count as a match
+SEARCH_FIELDS = "app_id, name, last_known_price, currency, discount_percent, is_free"
+
+_strip_marks = re.compile(r"[™®©]")
+_non_alnum = re.compile(r"[^0-9a-z]+")
+
+def normalize(text: str) -> str:
+    return _non_alnum.sub(" ", _strip_marks.sub("", text.lower())).strip()
+
+def name_trigrams(name: str) -> set:
+    # two leading spaces make the first grams of every word act as a prefix index
+    grams = set()
+    for token in name.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def query_trigrams(query: str) -> set:
+    # the last word may still be half-typed, so it only gets the leading pad
+    grams = set()
+    tokens = query.split()
+    for position, token in enumerate(tokens):
+        padded = f"  {token}" if position == len(tokens) - 1 else f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def is_strong_match(query: str, name: str) -> bool:
+    # every query word appears in the name, or the name holds all of the query's trigrams
+    normalized = normalize(query)
+    if not normalized or not name:
+        return False
+    name = normalize(name)
+    return all(token in name for token in normalized.split()) or query_trigrams(normalized) <= name_trigrams(name)
+
+class GameSearchIndex:
+    def __init__(self):
+        self.games = {}  # app_id -> search row
+        self.names = {}  # app_id -> normalized name
+        self.grams = {}  # app_id -> trigram set
+        self.postings = defaultdict(set)  # trigram -> app_ids
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def build_from_db(self):
+        started = time.perf_counter()
+        for rows in fetch_pages(lambda: supabase.table("games").select(SEARCH_FIELDS).order("app_id")):
+            self.add_many(rows)
+        self.ready = True
+        logger.info(f"Search index built with {len(self.games)} games in {time.perf_counter() - started:.2f}s.")
+
+    def add_many(self, games: list):
+        for game in games:
+            self.add(game)
+
+    def add(self, game: dict):
+        if not game.get("name"):
+            return
+        app_id = game["app_id"]
+        row = {field: game.get(field) for field in ("app_id", "name", "last_known_price", "currency", "discount_percent", "is_free")}
+        name = normalize(game["name"])
+        grams = name_trigrams(name)
+        with self._lock:
+            for gram in self.grams.get(app_id, ()):
+                self.postings[gram].discard(app_id)
+            self.games[app_id] = row
+            self.names[app_id] = name
+            self.grams[app_id] = grams
+            for gram in grams:
+                self.postings[gram].add(app_id)
+
+    def update_price(self, app_id: int, new_price: float, discount_percent: int):
+        row = self.games.get(app_id)
+        if row:
+            row["last_known_price"] = new_price
+            row["discount_percent"] = discount_percent
+
+    def search(self, query: str, limit: int = 10) -> list:
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        wanted = query_trigrams(normalized)
+        needed = max(1, math.ceil(len(wanted) * MIN_COVERAGE))
+        with self._lock:
+            # any name sharing `needed` grams must contain one of the rarest len - needed + 1, so only those are scanned
+            rarest = sorted(wanted, key=lambda gram: len(self.postings.get(gram, ())))
+            candidates = set()
+            for gram in rarest[:len(wanted) - needed + 1]:
+                candidates.update(self.postings.get(gram, ()))
+
+            scored = []
+            for app_id in candidates:
+                grams = self.grams[app_id]
+                count = len(wanted & grams)
+                if count < needed:
+                    continue
+                name = self.names[app_id]
+                # rank by how much of the query matched, then prefer exact prefixes and tighter names
+                score = count / len(wanted) + 0.2 * count / len(grams)
+                if name.startswith(normalized):
+                    score += 1.0
+                elif normalized in name:
+                    score += 0.5
+                scored.append((score, -len(name), app_id))
+
+            best = heapq.nlargest(limit, scored)
+            return [dict(self.games[app_id]) for _, _, app_id in best]
+
+search_index = GameSearchIndex()
@@ -1,5 +1,5 @@
-import httpx
 import os
+from backend.api.http_client import get_client
 
 
 async def verify_turnstile(token: str, ip: str = None) -> bool:
@@ -7,17 +7,16 @@ async def verify_turnstile(token: str, ip: str = None) -> bool:
         return False
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post("https://challenges.cloudflare.com/turnstile/v0/siteverify",
-            json = {
-                "secret": os.getenv("TURNSTILE_SECRET_KEY"),
-                "response": token,
-                "remoteip": ip,
-            },
-            timeout=10.0
-            )
-            data = response.json()
-            return data.get("success", False)
+        client = get_client("turnstile")
+        response = await client.post("/turnstile/v0/siteverify",
+        json = {
+            "secret": os.getenv("TURNSTILE_SECRET_KEY"),
+            "response": token,
+            "remoteip": ip,
+        }
+        )
+        data = response.json()
+        return data.get("success", False)
     except Exception as e:
         print(f"Turnstile verification error: {e}")
         return False
\ No newline at end of file
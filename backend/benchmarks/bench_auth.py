@@ -0,0 +1,43 @@
+# Per-request auth cost with and without the verified token cache.
+# Run from the repo root with the backend .env in place: python -m backend.benchmarks.bench_auth
+import asyncio
+import statistics
+import time
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+from backend.api import auth
+
+ITERATIONS = 20000
+
+def mint_token() -> str:
+    now = int(time.time())
+    claims = {"sub": "bench-user", "email": "bench@example.com", "aud": auth.SUPABASE_AUDIENCE, "iat": now, "exp": now + 3600}
+    return jwt.encode(claims, auth.SUPABASE_SECRET, algorithm="HS256")
+
+async def time_verify(credentials, clear_cache: bool) -> list:
+    samples = []
+    for _ in range(ITERATIONS):
+        if clear_cache:
+            auth.verified_tokens.clear()
+        started = time.perf_counter()
+        await auth.verify_token(credentials)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def report(label: str, samples: list):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    print(f"{label:<10} p50 {p50:8.1f}us  p99 {p99:8.1f}us  total {sum(samples):.3f}s")
+
+async def main():
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=mint_token())
+    uncached = await time_verify(credentials, clear_cache=True)
+    cached = await time_verify(credentials, clear_cache=False)
+    print(f"verify_token over {ITERATIONS} calls with one bearer token")
+    report("uncached", uncached)
+    report("cached", cached)
+    print(f"speedup    {statistics.median(uncached) / statistics.median(cached):.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,25 +1,39 @@
-from fastapi import Response, FastAPI, HTTPException, Path, Depends, Header, Request
+from fastapi import Response, FastAPI, HTTPException, Path, Query, Depends, Header, Request, Cookie
 from pydantic import BaseModel
 from backend.api.auth import verify_token, get_current_user, sync_user_profile, exchange_token_for_cookie, \
-    get_current_user_flexible
-from backend.api.helper import get_game_data, search_games_fallback, get_popular_games_from_steam
+    get_current_user_flexible, forget_token, profile_writer, require_admin, invalidate_roles
+from backend.api.helper import get_game_data, search_games_fallback
 from backend.api.ai_service import get_ai_game_recommendation
-from backend.supabase_client import supabase
 from backend.supabase_services.game_services import get_game_by_id, add_game, update_game_price
-from backend.supabase_services.price_history_services import get_latest_price, insert_price_history, get_price_history
-from backend.supabase_services.user_games_services import track_game_for_user, untrack_game_for_user
-from backend.supabase_services.user_profiles_services import is_admin
-from backend.supabase_services.price_alert_services import create_price_alert, get_user_alerts, delete_alert
+from backend.supabase_services.price_history_services import get_latest_price, insert_price_history, get_price_history_range
+from backend.supabase_services.user_games_services import track_game_for_user, untrack_game_for_user, tracked_games_query, \
+    get_tracked_games as get_tracked_games_for_user
+from backend.supabase_services.price_alert_services import create_price_alert, get_user_alerts, delete_alert, user_alerts_query
 from backend.models.game import Game
 from backend.api.turnstile_service import verify_turnstile
+from backend.api.http_client import open_clients, close_clients
+from backend.api.cache import cache_stats
+from backend.api.rate_limiter import limiter_stats
+from backend.api.search_index import search_index
+from backend.api.popular_games import popular_games_snapshot
+from backend.api.price_series import downsample, summarize
+from backend.api.pagination import decode_cursor, page_size, validate_sort, stream_ndjson, MAX_PAGE_SIZE
+from backend.api.email_outbox import outbox
+from backend.supabase_services.db import run_query, query_stats, shutdown as shutdown_db
+from backend.api.email_service import build_welcome_email
 import logging
 import os
-from datetime import datetime
-from backend.sync_prices import run_sync_prices
-from backend.sync_prices import start
+from datetime import datetime, timedelta
+from backend.sync_prices import submit_sync, get_sync_job
+from backend.watchlist_import import import_watchlist
+from backend.sync_schedule import schedule
+from backend.sync_prices import start, stop
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
 import sentry_sdk
 import stripe
 
@@ -37,7 +51,32 @@ logger = logging.getLogger(__name__)
 
 logger.info("app starting up...")
 
-app = FastAPI()
+# freshness is tracked per worker process: another worker's recent check doesn't count, it only costs a Steam call
+TRACK_PRICE_FRESHNESS = timedelta(minutes=float(os.getenv("TRACK_PRICE_FRESHNESS_MINUTES", "30")))
+
+async def build_search_index():
+    try:
+        await run_query(search_index.build_from_db)
+    except Exception as e:
+        logger.error(f"Failed to build search index, falling back to database search: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_clients()
+    # held on app.state so the loop's weak reference isn't the only one while the index builds
+    app.state.search_index_task = asyncio.create_task(build_search_index())
+    popular_games_snapshot.start()
+    outbox.start()
+    start()
+    async with profile_writer:
+        yield
+    popular_games_snapshot.stop()
+    await stop()
+    await asyncio.to_thread(outbox.stop)
+    await asyncio.to_thread(shutdown_db)
+    await close_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
@@ -77,6 +116,9 @@ class DonationRequest(BaseModel):
 class TokenRequest(BaseModel):
     token: str
 
+class WatchlistImportRequest(BaseModel):
+    app_ids: list[int]
+
 class AIRecommendationRequest(BaseModel):
     user_input: Optional[str] = None
 
@@ -86,12 +128,17 @@ def read_root():
 
 @app.get("/protected")
 async def protected(user = Depends(get_current_user)):
-    sync_user_profile(user)
+    await sync_user_profile(user)
     return {"message": "You are authenticated.",
             "user": user["sub"],
             "email": user.get("email")}
 @app.post("/logout")
-async def logout(response: Response):
+async def logout(response: Response, auth_token: Optional[str] = Cookie(None), authorization: Optional[str] = Header(None)):
+    # drop the cached verification so the token is decoded afresh if it is ever presented again
+    if auth_token:
+        forget_token(auth_token)
+    if authorization and authorization.startswith("Bearer "):
+        forget_token(authorization.split(" ")[1])
     response.delete_cookie("auth_token")
     logger.info("User logged out, cookie cleared.")
     return {"message": "User logged out successfully."}
@@ -99,8 +146,11 @@ async def logout(response: Response):
 async def track_price(app_id: int, user=Depends(get_current_user)):
     user_id = user["sub"]
     # confirms new users are in user_profiles table when they track their first game
-    sync_user_profile(user)
-    game_result = get_game_by_id(app_id)
+    await sync_user_profile(user)
+    game_result = await get_game_by_id(app_id)
+    check_history = True
+    game_added = False
+    price_update = None  # applied only after the history row, so games never runs ahead of price_history
     if not game_result or not game_result.data:
         app_data = await get_game_data(app_id)
         game_data = app_data["data"]
@@ -113,60 +163,64 @@ async def track_price(app_id: int, user=Depends(get_current_user)):
             last_known_price=game_data.get("price_overview", {}).get("final") / 100 if game_data.get("price_overview") else None,
             discount_percent=game_data.get("price_overview", {}).get("discount_percent", 0)
         )
-        add_game(new_game.model_dump())
+        inserted_game = await add_game(new_game.model_dump())
+        game_added = True
         game_name = new_game.name
         price_info = game_data.get("price_overview")
-        inserted_game = get_game_by_id(new_game.app_id)
-        inserted_game_data = inserted_game.data[0]
-        game_id = inserted_game_data["id"]
+        game_id = inserted_game[0]["id"]
+    elif schedule.is_price_fresh(app_id, TRACK_PRICE_FRESHNESS):
+        # the sync or another track read this price from Steam recently, and recorded its history then
+        game_data = game_result.data[0]
+        game_name = game_data["name"]
+        game_id = game_data["id"]
+        price_info = stored_price_info(game_data)
+        check_history = False
     else:
         app_data = await get_game_data(app_id)
         game_data = game_result.data[0]
         game_name = game_data["name"]
-        new_current_price = app_data["data"].get("price_overview").get("final")
-        db_price = game_data.get("last_known_price")
-        new_discount = app_data["data"].get("price_overview").get("discount_percent")
-        db_percent = game_data.get("discount_percent")
-        # can possibly refactor this to run the conditional first
-        price_info = {
-            "initial": app_data["data"].get("price_overview").get("initial"),
-            "final": new_current_price if new_current_price != db_price else db_price,
-            "discount_percent": new_discount if new_discount != db_percent else db_percent,
-            "currency": game_data.get("currency")
-        }
-        if (new_current_price != db_price) or (new_discount != db_percent):
-            update_game_price(app_id, new_price=new_current_price / 100, discount_percent=new_discount)
-        #initial_price = game_data.get("initial_price")
         game_id = game_data["id"]
-    already_tracking = False
-    try:
-        track_game_for_user(user_id, app_id)
-    except HTTPException as e:
-        if e.status_code == 400:
-            already_tracking = True
-            logger.info(f"User {user_id} is already tracking App ID {app_id}. Continuing to price tracking.")
-        else:
-            raise
-
+        price_info = app_data["data"].get("price_overview")
+        if price_info:
+            new_price = price_info.get("final") / 100
+            new_discount = price_info.get("discount_percent")
+            db_price = game_data.get("last_known_price")
+            if db_price is None or float(db_price) != new_price or new_discount != game_data.get("discount_percent"):
+                price_update = (new_price, new_discount)
+
+    already_tracking = not await track_game_for_user(user_id, app_id)
+    if already_tracking:
+        logger.info(f"User {user_id} is already tracking App ID {app_id}. Continuing to price tracking.")
 
     if price_info and price_info.get("final") is not None:
         current_price = price_info.get("final") / 100
         current_initial = price_info.get("initial") / 100
         discount = price_info.get("discount_percent", 0)
         currency = price_info.get("currency")
-        latest = get_latest_price(game_id)
+        latest = await get_latest_price(game_id) if check_history else None
 
         logger.info(f"Latest from DB: {latest}")
         logger.info(f"Current final price: {current_price}")
 
-        if not latest or float(latest["final_price"]) != float(current_price):
-            insert_price_history(
-                game_id=game_id,
-                initial_price=current_initial,
-                final_price=current_price,
-                discount_percent=discount,
-                currency=currency
-            )
+        if check_history and (not latest or float(latest["final_price"]) != float(current_price)):
+            try:
+                await insert_price_history(
+                    game_id=game_id,
+                    initial_price=current_initial,
+                    final_price=current_price,
+                    discount_percent=discount,
+                    currency=currency
+                )
+            except Exception:
+                if game_added:
+                    # the new row already carries the price; clear it so the next sync sees a change and writes the history
+                    await update_game_price(app_id, new_price=None, discount_percent=0)
+                raise
+        if price_update:
+            await update_game_price(app_id, new_price=price_update[0], discount_percent=price_update[1])
+        if check_history:
+            # only once the price is stored can other requests trust the games row
+            schedule.record_price_check(app_id)
         if already_tracking:
             return {"message": f"You are already tracking '{game_name}'. Price updated if changed.",
                     "price": price_info,
@@ -178,15 +232,54 @@ async def track_price(app_id: int, user=Depends(get_current_user)):
                     "already_tracking": False
                     }
     else:
+        if check_history:
+            schedule.record_price_check(app_id)
         return FreeOrUnavailable(message=f"{game_name} is either free or unavailable, add priced games to your watchlist.")
 
+def stored_price_info(game: dict):
+    # rebuilds Steam's price_overview (in cents) from the games row; the games table doesn't store
+    # initial, so it is derived from the discount and flagged as an estimate
+    if game.get("is_free") or game.get("last_known_price") is None:
+        return None
+    final = round(float(game["last_known_price"]) * 100)
+    discount = game.get("discount_percent") or 0
+    initial = round(final * 100 / (100 - discount)) if discount < 100 else final
+    return {
+        "initial": initial,
+        "final": final,
+        "discount_percent": discount,
+        "currency": game.get("currency"),
+        "initial_estimated": True
+    }
+
+@app.post("/track-bulk", summary="Track many games at once")
+async def track_bulk(request: WatchlistImportRequest, user=Depends(get_current_user)):
+    await sync_user_profile(user)
+    return await import_watchlist(user["sub"], request.app_ids)
 
 
 @app.get("/tracked", summary="Get tracked games for user")
-async def get_tracked_games(user=Depends(get_current_user)):
+async def get_tracked_games(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    stream: bool = False,
+    user=Depends(get_current_user)
+):
     user_id = user["sub"]
-    tracked_games = supabase.table("user_games").select("*, games(name, last_known_price, currency, discount_percent, is_free)").eq("user_id", user_id).execute()
-    return tracked_games.data
+    if cursor is None and limit is None and sort is None and not stream:
+        # unpaginated callers keep the original full list
+        return await get_tracked_games_for_user(user_id)
+
+    sort = validate_sort(sort or "default")
+    after = decode_cursor(cursor, sort)
+    query = tracked_games_query(user_id)
+    if stream:
+        pages = query.pages(sort, after, page_size(limit or MAX_PAGE_SIZE))
+        return StreamingResponse(stream_ndjson(pages), media_type="application/x-ndjson")
+
+    rows, next_cursor = await run_query(query.page, sort, after, page_size(limit), name="user_games.tracked_page")
+    return {"tracked": rows, "next_cursor": next_cursor}
 
 @app.get("/price/{app_id}", response_model=PriceOverview | FreeOrUnavailable)
 async def get_game_prices(app_id: int, payload: dict = Depends(verify_token)):
@@ -209,38 +302,72 @@ async def search_games(query: str, limit: int = 10):
     return await search_games_fallback(query, limit)
 
 @app.get("/price-history/{app_id}")
-async def get_game_price_history(app_id: int = Path(..., title="Steam App ID")):
+async def get_game_price_history(
+    app_id: int = Path(..., title="Steam App ID"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    points: int = Query(100, ge=3, le=1000)
+):
     try:
-        game_data = get_game_by_id(app_id)
-        if not game_data:
+        game_data = await get_game_by_id(app_id)
+        if not game_data or not game_data.data:
             raise HTTPException(status_code=404, detail="Game not found")
 
         game_id = game_data.data[0]["id"]
-        price_history = get_price_history(game_id)
+        rows = await get_price_history_range(
+            game_id,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None
+        )
+        series = downsample(rows, points)
 
         return {
             "app_id": app_id,
             "game_name": game_data.data[0]["name"],
-            "price_history": price_history
+            "price_history": series[::-1],
+            "stats": summarize(rows, until=end)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching price history for app_id {app_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch price history")
 
 @app.get("/alerts")
-async def get_alerts(user=Depends(get_current_user)):
+async def get_alerts(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    stream: bool = False,
+    user=Depends(get_current_user)
+):
     user_id = user["sub"]
-    alerts = get_user_alerts(user_id)
+    if cursor is None and limit is None and sort is None and not stream:
+        alerts = await get_user_alerts(user_id)
+        return {
+            "alerts": alerts,
+            "count": len(alerts)
+        }
+
+    sort = validate_sort(sort or "default")
+    after = decode_cursor(cursor, sort)
+    query = user_alerts_query(user_id)
+    if stream:
+        pages = query.pages(sort, after, page_size(limit or MAX_PAGE_SIZE))
+        return StreamingResponse(stream_ndjson(pages), media_type="application/x-ndjson")
+
+    alerts, next_cursor = await run_query(query.page, sort, after, page_size(limit), name="price_alerts.user_alerts_page")
     return {
         "alerts": alerts,
-        "count": len(alerts)
+        "count": len(alerts),
+        "next_cursor": next_cursor
     }
 
 @app.post("/alerts")
 async def create_alerts(alert_data: AlertRequest, user=Depends(get_current_user)):
     user_id = user["sub"]
 
-    result = create_price_alert(
+    result = await create_price_alert(
         user_id=user_id,
         app_id=alert_data.app_id,
         alert_type=alert_data.alert_type,
@@ -255,13 +382,13 @@ async def create_alerts(alert_data: AlertRequest, user=Depends(get_current_user)
 @app.delete("/alerts/{alert_id}")
 async def delete_alert_endpoint(alert_id: int, user=Depends(get_current_user)):
     user_id = user["sub"]
-    delete_alert(alert_id, user_id)
+    await delete_alert(alert_id, user_id)
     return {"message": "Alert deleted successfully."}
 
 @app.delete("/untrack/{app_id}")
 async def untrack_game(app_id: int, user=Depends(get_current_user)):
     user_id = user["sub"]
-    untrack_game_for_user(user_id=user_id, app_id=app_id)
+    await untrack_game_for_user(user_id=user_id, app_id=app_id)
     return {"message": "Game removed from watchlist."}
 
 @app.post("/exchange-token")
@@ -269,25 +396,47 @@ async def exchange_token(request: TokenRequest, response: Response):
     return await exchange_token_for_cookie(request.token, response)
 
 @app.post("/admin/sync")
-async def trigger_sync(user=Depends(get_current_user)):
+async def trigger_sync(user=Depends(require_admin)):
     user_id = user["sub"]
 
-    if not is_admin(user["sub"]):
-        raise HTTPException(status_code=403, detail="Admin access required.")
-
-    await run_sync_prices()
-    logger.info(f"Admin {user_id} triggered sync.")
-    return {"message": "Sync completed"}
+    job, started = submit_sync(trigger=f"admin:{user_id}")
+    logger.info(f"Admin {user_id} triggered sync {job.id}.")
+    return JSONResponse(status_code=202, content={
+        "message": "Sync started" if started else "Sync already running",
+        **job.to_dict()
+    })
+
+@app.get("/admin/sync/status")
+async def get_sync_status(job_id: Optional[str] = None, user=Depends(require_admin)):
+    job = get_sync_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found.")
+    return job.to_dict()
+
+@app.get("/admin/cache-stats")
+async def get_cache_stats(user=Depends(require_admin)):
+    return {"caches": cache_stats()}
+
+@app.get("/admin/rate-limits")
+async def get_rate_limits(user=Depends(require_admin)):
+    return {"limiters": limiter_stats()}
+
+@app.get("/admin/db-stats")
+async def get_db_stats(user=Depends(require_admin)):
+    return {"queries": query_stats.stats()}
+
+@app.post("/admin/invalidate-roles")
+async def invalidate_role_cache(supabase_id: Optional[str] = None, user=Depends(require_admin)):
+    invalidate_roles(supabase_id)
+    logger.info(f"Admin {user['sub']} invalidated cached roles for {supabase_id or 'all users'}.")
+    return {"message": "Role cache invalidated.", "supabase_id": supabase_id}
 
 @app.post("/admin/add-game/{app_id}")
-async def add_game_to_db(app_id: int, user=Depends(get_current_user)):
+async def add_game_to_db(app_id: int, user=Depends(require_admin)):
     try:
         user_id = user["sub"]
 
-        if not is_admin(user_id):
-            raise HTTPException(status_code=403, detail="Admin access required.")
-
-        game_result = get_game_by_id(app_id)
+        game_result = await get_game_by_id(app_id)
         if game_result and game_result.data:
             return {
                     "message": "Game already exists in database.",
@@ -309,14 +458,14 @@ async def add_game_to_db(app_id: int, user=Depends(get_current_user)):
         )
 
 
-        add_game(new_game.model_dump())
+        await add_game(new_game.model_dump())
 
         if new_game.last_known_price is not None:
-            inserted_game = get_game_by_id(new_game.app_id)
+            inserted_game = await get_game_by_id(new_game.app_id)
             if inserted_game and inserted_game.data:
                 game_id = inserted_game.data[0]["id"]
-                update_game_price(app_id, new_price=new_game.last_known_price, discount_percent=new_game.discount_percent)
-                insert_price_history(
+                await update_game_price(app_id, new_price=new_game.last_known_price, discount_percent=new_game.discount_percent)
+                await insert_price_history(
                     game_id=game_id,
                     initial_price=new_game.last_known_price,
                     final_price=new_game.last_known_price,
@@ -340,7 +489,7 @@ async def add_game_to_db(app_id: int, user=Depends(get_current_user)):
 async def test_alerts(user=Depends(get_current_user)):
     user_id = user["sub"]
     from backend.supabase_services.price_alert_services import check_price_alerts
-    check_price_alerts()
+    await check_price_alerts()
     return {"message": "Alerts tested successfully."}
 
 @app.post("/test-welcome-email")
@@ -350,9 +499,8 @@ async def test_welcome_email(user=Depends(get_current_user)):
         if not email:
             raise HTTPException(status_code=400, detail="Email not found in user profile.")
 
-        from backend.api.email_service import send_welcome_email
         username = email.split("@")[0].title() if email else "User"
-        status_code, response = send_welcome_email(email, username)
+        status_code, response = await asyncio.wrap_future(outbox.submit(email, *build_welcome_email(username)))
 
         if status_code == 200:
             logger.info(f"Test welcome email sent to {email}")
@@ -406,8 +554,8 @@ async def create_donation_checkout(donation_data: DonationRequest, user=Depends(
 @app.get("/popular-games")
 async def get_popular_games(limit: int = 10):
     try:
-       games = await get_popular_games_from_steam(limit)
-       return {"games": games}
+        payload = await popular_games_snapshot.get_payload(limit)
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
         logger.error(f"Error fetching popular games: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch popular games")
@@ -433,6 +581,3 @@ async def verify_turnstile_endpoint(request: TurnstileRequest, http_request: Req
     if not is_valid:
         raise HTTPException(status_code=400, detail="Invalid Captcha")
     return {"success": True}
-
-start()
-
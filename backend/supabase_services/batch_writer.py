@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "2"))
+
+class BatchWriter:
+    # write_batch(rows) and write_one(row) are awaitable, e.g. db_query service functions
+    def __init__(self, name: str, write_batch, write_one, batch_size: int = None, flush_interval: float = None):
+        self.name = name
+        self.write_batch = write_batch
+        self.write_one = write_one
+        self.batch_size = batch_size or WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or WRITE_FLUSH_INTERVAL
+        self._rows = []
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.written = 0
+        self.round_trips = 0
+        self.retried = 0
+        self.failed = []
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self.flush()
+        logger.info(
+            f"{self.name} writer: {self.written} rows in {self.round_trips} round trips, "
+            f"{self.retried} retried per row, {len(self.failed)} failed."
+        )
+
+    async def add(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            rows, self._rows = self._rows, []
+            for start in range(0, len(rows), self.batch_size):
+                await self._write_chunk(rows[start:start + self.batch_size])
+
+    async def _write_chunk(self, chunk: list):
+        try:
+            await self.write_batch(chunk)
+            self.round_trips += 1
+            self.written += len(chunk)
+            return
+        except Exception as e:
+            logger.warning(f"{self.name} batch of {len(chunk)} failed, retrying row by row: {e}")
+
+        # one bad row shouldn't cost the rest of the batch
+        for row in chunk:
+            self.retried += 1
+            try:
+                await self.write_one(row)
+                self.round_trips += 1
+                self.written += 1
+            except Exception as e:
+                self.failed.append(row)
+                logger.error(f"{self.name} write failed for {row}: {e}")
@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "1.0"))
+PAGE_SIZE = 1000  # PostgREST's default max rows per response
+ID_CHUNK_SIZE = 200  # keeps in_() filters well under URL length limits
+
+# supabase-py is synchronous; its calls run here so a slow query only holds a pool thread, never the event loop
+executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="supabase")
+
+# hook(name, seconds, error) runs after every query; error is None on success
+query_hooks = []
+
+def add_query_hook(hook):
+    query_hooks.append(hook)
+
+class QueryStats:
+    def __init__(self):
+        self._stats = {}  # query name -> [calls, errors, total seconds, max seconds]
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str, seconds: float, error: Exception = None):
+        with self._lock:
+            entry = self._stats.setdefault(name, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += error is not None
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+        if seconds >= SLOW_QUERY_SECONDS:
+            logger.warning(f"Slow query {name}: {seconds:.2f}s")
+
+    def stats(self) -> list:
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: item[1][2], reverse=True)
+        return [
+            {
+                "name": name,
+                "calls": calls,
+                "errors": errors,
+                "avg_ms": round(total / calls * 1000, 1),
+                "max_ms": round(longest * 1000, 1),
+                "total_seconds": round(total, 3),
+            }
+            for name, (calls, errors, total, longest) in items
+        ]
+
+query_stats = QueryStats()
+add_query_hook(query_stats)
+
+def _query_name(fn) -> str:
+    module = getattr(fn, "__module__", None) or ""
+    name = getattr(fn, "__qualname__", None) or repr(fn)
+    return f"{module.rsplit('.', 1)[-1]}.{name}" if module else name
+
+async def run_query(fn, *args, name: str = None, **kwargs):
+    loop = asyncio.get_running_loop()
+    # carry context vars into the pool thread like asyncio.to_thread does
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    started = time.perf_counter()
+    error = None
+    try:
+        return await loop.run_in_executor(executor, call)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        for hook in query_hooks:
+            try:
+                hook(name or _query_name(fn), elapsed, error)
+            except Exception as e:
+                logger.error(f"Query hook failed: {e}")
+
+def db_query(fn):
+    # the decorated function is awaitable; fn.sync keeps the blocking version for code already off the loop
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_query(fn, *args, name=_query_name(fn), **kwargs)
+    wrapper.sync = fn
+    return wrapper
+
+def fetch_pages(build_query, page_size: int = PAGE_SIZE):
+    # build_query() returns a fresh, ordered query each time (builders keep their range params);
+    # yields one page of rows at a time until a short page shows the end
+    start = 0
+    while True:
+        rows = build_query().range(start, start + page_size - 1).execute().data or []
+        yield rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+def chunks(items, size: int = ID_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def shutdown():
+    executor.shutdown(wait=True)
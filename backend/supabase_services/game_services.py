@@ -1,18 +1,46 @@
 # game_services.py
 from backend.supabase_client import supabase
+from backend.supabase_services.db import db_query, chunks, fetch_pages
+from backend.api.search_index import search_index
+
+@db_query
 def add_game(game_data: dict):
     result = supabase.table("games").insert(game_data).execute()
+    search_index.add_many(result.data or [])
     return result.data
 
+@db_query
 def get_game_by_id(app_id: int):
     return supabase.table("games").select("*").eq("app_id", app_id).execute()
 
-def get_games():
-    return supabase.table("games").select("*").execute()
+@db_query
+def get_games_by_app_ids(app_ids: list):
+    games = []
+    for chunk in chunks(app_ids):
+        result = supabase.table("games").select("*").in_("app_id", chunk).execute()
+        games.extend(result.data or [])
+    return games
+
+@db_query
+def get_games() -> list:
+    # paged, since one select stops at PostgREST's max rows and the catalog runs to thousands
+    return [game for page in fetch_pages(lambda: supabase.table("games").select("*").order("id")) for game in page]
 
+@db_query
 def update_game_price(app_id: int, new_price: float, discount_percent: int):
     result = supabase.table("games").update({"last_known_price": new_price, "discount_percent": discount_percent}).eq("app_id", app_id).execute()
+    search_index.update_price(app_id, new_price, discount_percent)
+
+@db_query
+def upsert_game_prices(games: list):
+    # rows carry the full game record so the upsert never trips over NOT NULL columns
+    if not games:
+        return []
+    result = supabase.table("games").upsert(games, on_conflict="app_id").execute()
+    search_index.add_many(result.data or [])
+    return result.data
 
+@db_query
 def search_games_in_db(query: str, limit: int = 10):
     try:
         result = supabase.table("games").select("*").ilike("name", f"%{query}%").limit(limit).execute()
@@ -1,13 +1,18 @@
+import asyncio
 import datetime
 
 from backend.supabase_client import supabase
+from backend.supabase_services.db import db_query, fetch_pages, chunks
 from backend.supabase_services.game_services import get_game_by_id
-from backend.api.email_service import send_email
+from backend.api.email_outbox import outbox
+from backend.api.email_templates import render_alert_email
+from backend.api.pagination import KeysetQuery
 import logging
 logger = logging.getLogger(__name__)
+@db_query
 def create_price_alert(user_id: str, app_id: int, alert_type: str, target_value: float):
     try:
-        game_result = get_game_by_id(app_id)
+        game_result = get_game_by_id.sync(app_id)
         if not game_result.data:
             return {"error": "Game not found"}
         
@@ -32,17 +37,23 @@ def create_price_alert(user_id: str, app_id: int, alert_type: str, target_value:
         print(f"Error creating price alert: {e}")
         return {"error": str(e)}
 
+USER_ALERT_FIELDS = "*, games(name, last_known_price, currency, discount_percent, app_id)"
+USER_ALERT_KEY_FIELDS = "id, games(name, last_known_price, discount_percent)"
+
+def user_alerts_query(user_id: str) -> KeysetQuery:
+    return KeysetQuery("price_alerts", USER_ALERT_FIELDS, USER_ALERT_KEY_FIELDS, "id", {"user_id": user_id, "is_active": True})
+
+@db_query
 def get_user_alerts(user_id: str):
     try:
-        result = supabase.table("price_alerts").select(
-            "*, games(name, last_known_price, currency, discount_percent, app_id)"
-        ).eq("user_id", user_id).eq("is_active", True).execute()
+        result = supabase.table("price_alerts").select(USER_ALERT_FIELDS).eq("user_id", user_id).eq("is_active", True).execute()
         
         return result.data if result.data else []
     except Exception as e:
         print(f"Error getting user alerts: {e}")
         return []
 
+@db_query
 def delete_alert(alert_id: int, user_id: str):
     try:
         result = supabase.table("price_alerts").delete().eq("id", alert_id).eq("user_id", user_id).execute()
@@ -59,17 +70,39 @@ def toggle_alert(alert_id: int, user_id: str, is_active: bool):
         print(f"Error toggling alert: {e}")
         return None
 
-def get_active_alerts():
-    try:
-        result = supabase.table("price_alerts").select(
+def _fetch_active_alerts(game_ids: list = None, unchecked: bool = False):
+    def build_query():
+        query = supabase.table("price_alerts").select(
             "*, games(app_id, name, last_known_price, discount_percent)"
-        ).eq("is_active", True).execute()
-        
-        return result.data if result.data else []
+        ).eq("is_active", True)
+        if game_ids is not None:
+            query = query.in_("game_id", game_ids)
+        if unchecked:
+            query = query.is_("last_checked_price", "null")
+        return query.order("id")
+    return [alert for page in fetch_pages(build_query) for alert in page]
+
+@db_query
+def get_active_alerts(game_ids: list = None):
+    try:
+        if game_ids is None:
+            return _fetch_active_alerts()
+        # alerts created since the last run have never been evaluated, so they are checked even if their game's price held
+        alerts = {alert["id"]: alert for alert in _fetch_active_alerts(unchecked=True)}
+        for chunk in chunks(game_ids):
+            alerts.update((alert["id"], alert) for alert in _fetch_active_alerts(chunk))
+        return list(alerts.values())
     except Exception as e:
         print(f"Error getting active alerts: {e}")
         return []
 
+@db_query
+def reset_triggered_alerts(game_ids: list):
+    # a sale ended, so these games' alerts may fire again on the next one
+    for chunk in chunks(game_ids):
+        supabase.table("price_alerts").update({"triggered_at": None}).in_("game_id", chunk).execute()
+
+@db_query
 def trigger_alert(alert_id: int, current_price: float):
     try:
         result = supabase.table("price_alerts").update({
@@ -83,134 +116,112 @@ def trigger_alert(alert_id: int, current_price: float):
         print(f"Error triggering alert: {e}")
         return None
 
-def check_price_alerts():
-    try:
-        alerts = get_active_alerts()
-        logger.info(f"Found {len(alerts)} price alerts...")
-        user_triggered_alerts = {}
-
-        for alert in alerts:
-            logger.info(f"Checking alert: {alert['alert_type']} with target {alert['target_value']}")
-            game = alert["games"]
-            current_price = game["last_known_price"]
-            discount_percent = game.get("discount_percent", 0)
-            logger.info(f"Game Discount: {discount_percent}, should_trigger will be calculated...")
-            should_trigger = False
-
+def _group_ids_by_price(entries: list):
+    ids_by_price = {}
+    for alert_id, price in entries:
+        ids_by_price.setdefault(price, []).append(alert_id)
+    return ids_by_price
+
+def evaluate_alerts(alerts: list):
+    user_triggered_alerts = {}
+    checked = []
+
+    for alert in alerts:
+        game = alert.get("games")
+        if not game or game.get("last_known_price") is None:
+            continue
+        current_price = game["last_known_price"]
+        discount_percent = game.get("discount_percent") or 0
+        should_trigger = False
+
+        if alert["triggered_at"] is None and discount_percent > 0:
             if alert["alert_type"] == "percentage_discount":
-                should_trigger = (discount_percent > 0 and discount_percent >= alert["target_value"] and alert["triggered_at"] is None)
-                logger.info(f"Percentage check: {discount_percent} >= {alert['target_value']} and discount > 0 = {should_trigger}")
+                should_trigger = discount_percent >= alert["target_value"]
             elif alert["alert_type"] == "price_drop":
-                if alert["last_checked_price"] and current_price < alert['last_checked_price'] and discount_percent > 0 and alert["triggered_at"] is None:
-                    should_trigger = True
-
-            if should_trigger:
-                user_id = alert["user_id"]
-                if user_id not in user_triggered_alerts:
-                    user_triggered_alerts[user_id] = []
-
-                user_triggered_alerts[user_id].append({
-                    'alert': alert,
-                    'game': game,
-                    'current_price': current_price,
-                    'discount_percent': discount_percent
-                })
-            else:
-                supabase.table("price_alerts").update({"last_checked_price": current_price}).eq("id", alert["id"]).execute()
+                should_trigger = bool(alert["last_checked_price"]) and current_price < alert["last_checked_price"]
+
+        if should_trigger:
+            user_triggered_alerts.setdefault(alert["user_id"], []).append({
+                'alert': alert,
+                'game': game,
+                'current_price': current_price,
+                'discount_percent': discount_percent
+            })
+        else:
+            checked.append((alert["id"], current_price))
+
+    return user_triggered_alerts, checked
+
+@db_query
+def update_last_checked_prices(checked: list):
+    # one update per distinct price instead of one per alert
+    for price, alert_ids in _group_ids_by_price(checked).items():
+        for chunk in chunks(alert_ids):
+            supabase.table("price_alerts").update({"last_checked_price": price}).in_("id", chunk).execute()
+
+@db_query
+def trigger_alerts(triggered: list):
+    triggered_at = datetime.datetime.now(datetime.UTC).isoformat()
+    for price, alert_ids in _group_ids_by_price(triggered).items():
+        for chunk in chunks(alert_ids):
+            supabase.table("price_alerts").update({
+                "triggered_at": triggered_at,
+                "last_checked_price": price,
+            }).in_("id", chunk).execute()
+
+@db_query
+def get_emails_by_user(user_ids: list):
+    emails_by_user = {}
+    for chunk in chunks(user_ids):
+        result = supabase.table("user_profiles").select("supabase_id, email").in_("supabase_id", chunk).execute()
+        for profile in result.data or []:
+            if profile.get("email"):
+                emails_by_user.setdefault(profile["supabase_id"], []).append(profile["email"])
+    return emails_by_user
+
+def build_alert_email(triggered_alerts: list):
+    return render_alert_email([
+        (
+            alert_data["alert"]["alert_type"],
+            alert_data["game"]["name"],
+            alert_data["current_price"],
+            alert_data["discount_percent"],
+            alert_data["alert"].get("last_checked_price"),
+        )
+        for alert_data in triggered_alerts
+    ])
+
+async def check_price_alerts(game_ids: list = None):
+    # game_ids limits the check to games whose price just changed plus never-checked alerts; None checks every alert
+    try:
+        alerts = await get_active_alerts(game_ids)
+        logger.info(f"Found {len(alerts)} price alerts...")
+        user_triggered_alerts, checked = evaluate_alerts(alerts)
+        logger.info(f"{sum(len(t) for t in user_triggered_alerts.values())} alerts triggered for {len(user_triggered_alerts)} users.")
 
+        await update_last_checked_prices(checked)
 
+        emails_by_user = await get_emails_by_user(list(user_triggered_alerts))
+        queued = []
         for user_id, triggered_alerts in user_triggered_alerts.items():
-            get_emails = supabase.table("user_profiles").select("email").eq("supabase_id", user_id).execute()
-            emails = [user["email"] for user in get_emails.data if user.get("email")]
+            emails = emails_by_user.get(user_id, [])
             logger.info(f"Found emails for user {user_id}: {emails}")
             if not emails:
                 continue
 
+            subject, text, html_content = build_alert_email(triggered_alerts)
             for email in emails:
-                if len(triggered_alerts) == 1:
-                    subject = f"Price alert: {triggered_alerts[0]["game"]["name"]} is on sale!"
-                else:
-                    subject = f"Price alert: {len(triggered_alerts)} games are on sale!"
-
-                html_content = f"""
-                 <!DOCTYPE html>
-                 <html>
-                 <head>
-                     <meta charset="utf-8">
-                     <style>
-                         body {{ font-family: Arial, sans-serif; background-color: #f9fafb; color: #1f2937; margin: 0; padding: 20px; }}
-                         .container {{ max-width: 600px; margin: 0 auto; background-color: #0f172a; padding: 20px; border-radius: 8px; }}
-                         .header {{ text-align: center; margin-bottom: 20px; }}
-                         .game-item {{ background-color: #1e293b; padding: 15px; margin: 10px 0; border-radius: 5px; border-left: 4px solid #3b82f6; }}
-                         .game-name {{ font-size: 18px; font-weight: bold; color: #ffffff; }}
-                         .discount {{ color: #3b82f6; font-size: 16px; margin-top: 5px; }}
-                         .footer {{ text-align: center; margin-top: 20px; font-size: 12px; color: #9ca3af; }}
-                     </style>
-                 </head>
-                 <body>
-                     <div class="container">
-                         <div class="header">
-                             <h2 style="color: #3b82f6; margin: 0;">SteamPriceTracker Alert</h2>
-                         </div>
-                         <div class="content">
-                 """
-
-
-                for alert_data in triggered_alerts:
-                    game = alert_data["game"]
-                    alert = alert_data["alert"]
-                    current_price = alert_data["current_price"]
-                    discount_percent = alert_data["discount_percent"]
-
-                    if alert["alert_type"] == "percentage_discount":
-                        original_price = current_price / (1 - discount_percent / 100)
-                        html_content += f"""
-                             <div class="game-item">
-              <div class="game-name">{game['name']}</div>
-              <div class="discount">
-                  <span style="color: #6b7280; text-decoration: line-through;">${original_price:.2f}</span>
-                  <span style="color: #3b82f6; font-weight: 600;"> ${current_price:.2f}</span>
-                  <span style="color: #dc2626; font-weight: 600;"> -{discount_percent}%</span>
-              </div>
-          </div>
-      """
-
-                    elif alert["alert_type"] == "price_drop":
-                        old_price = alert.get("last_checked_price", "N/A")
-                        if old_price:
-                            html_content += f"""
-                                     <div class="game-item">
-                                         <div class="game-name">{game['name']}</div>
-                                         <div class="discount">Price dropped to ${current_price:.2f} (was ${old_price:.2f})</div>
-                                     </div>
-                                 """
-                        else:
-                            html_content += f"""
-                                     <div class="game-item">
-                                         <div class="game-name">{game['name']}</div>
-                                         <div class="discount">Price dropped to ${current_price:.2f}</div>
-                                    </div>
-                            """
-
-                html_content += """
-                             </div>
-                             <div class="footer">
-                                 <p>Visit Steam to grab these deals before they expire!</p>
-                             </div>
-                         </div>
-                     </body>
-                     </html>
-                     """
-
-                text = "\n".join(
-                    [f"{alert_data['game']['name']}: {alert_data['discount_percent']}% OFF on Steam!" for alert_data in
-                     triggered_alerts])
-
-                status, response = send_email(to_email=email, subject=subject, text=text, html=html_content)
-                logger.info(f"Email status: {status}, response: {response}")
-                if status == 200:
-                    for alert_data in triggered_alerts:
-                        trigger_alert(alert_data["alert"]["id"], alert_data["current_price"])
+                queued.append((outbox.submit(to_email=email, subject=subject, text=text, html=html_content), triggered_alerts))
+
+        # alerts are only marked triggered once Mailjet has confirmed the email
+        delivered = []
+        for future, triggered_alerts in queued:
+            status, response = await asyncio.wrap_future(future)
+            logger.info(f"Email status: {status}, response: {response}")
+            if status == 200:
+                delivered.extend((alert_data["alert"]["id"], alert_data["current_price"]) for alert_data in triggered_alerts)
+
+        await trigger_alerts(list(dict(delivered).items()))
     except Exception as e:
         print(f"Error checking price alerts: {e}")
-        return None
\ No newline at end of file
+        return None
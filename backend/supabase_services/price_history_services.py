@@ -1,6 +1,10 @@
 from backend.supabase_client import supabase
+from backend.supabase_services.db import db_query, fetch_pages
+from backend.analytics.price_store import record_price_history
 import logging
 logger = logging.getLogger(__name__)
+
+@db_query
 def get_latest_price(game_id: int):
     result = supabase.table("price_history").select("*").eq("game_id", game_id).order("timestamp", desc=True).limit(1).execute()
     if result.data:
@@ -8,6 +12,7 @@ def get_latest_price(game_id: int):
     else:
         return None
 
+@db_query
 def insert_price_history(game_id: int, initial_price: float, final_price: float, discount_percent: int, currency: str):
     logger.info("Inserting price history...")
     print({
@@ -28,13 +33,36 @@ def insert_price_history(game_id: int, initial_price: float, final_price: float,
     result = supabase.table("price_history").insert(entry).execute()
     logger.info("Inserting price history...")
     if result.data:
+        record_price_history(result.data)
         return result.data[0]
     else:
         raise Exception(f"Failed to insert price history: {result}")
 
+@db_query
+def insert_price_history_batch(entries: list):
+    if not entries:
+        return []
+    result = supabase.table("price_history").insert(entries).execute()
+    logger.info(f"Inserted {len(result.data or [])} price history rows.")
+    record_price_history(result.data or [])
+    return result.data
+
+@db_query
 def get_price_history(game_id: int, limit: int = 100):
     result = supabase.table("price_history").select("*").eq("game_id", game_id).order("timestamp", desc=True).limit(limit).execute()
     if result.data:
         return result.data
     else:
-        raise Exception(f"Failed to get price history.")
\ No newline at end of file
+        raise Exception(f"Failed to get price history.")
+
+@db_query
+def get_price_history_range(game_id: int, start: str = None, end: str = None):
+    # oldest first, every row in the window, paged past the max rows limit
+    def build_query():
+        query = supabase.table("price_history").select("timestamp, initial_price, final_price, discount_percent, currency").eq("game_id", game_id)
+        if start:
+            query = query.gte("timestamp", start)
+        if end:
+            query = query.lte("timestamp", end)
+        return query.order("timestamp")
+    return [row for page in fetch_pages(build_query) for row in page]
@@ -1,28 +1,68 @@
 # user_games_services.py
 from fastapi import HTTPException
 
-from backend.api.email_service import send_email
+from backend.api.email_outbox import outbox
+from backend.api.pagination import KeysetQuery
 from backend.supabase_client import supabase
+from backend.supabase_services.db import db_query, run_query, chunks
 from datetime import datetime, timedelta, timezone
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
-def track_game_for_user(user_id: int, app_id: int):
-    existing = supabase.table("user_games").select("*").eq("user_id", user_id).eq("app_id", app_id).execute()
-    if existing.data:
-        raise HTTPException(status_code=400, detail="Game already tracked for user")
+
+TRACKED_FIELDS = "*, games(name, last_known_price, currency, discount_percent, is_free)"
+TRACKED_KEY_FIELDS = "app_id, games(name, last_known_price, discount_percent)"
+
+def tracked_games_query(user_id: str) -> KeysetQuery:
+    return KeysetQuery("user_games", TRACKED_FIELDS, TRACKED_KEY_FIELDS, "app_id", {"user_id": user_id})
+
+@db_query
+def get_tracked_games(user_id: str):
+    result = supabase.table("user_games").select(TRACKED_FIELDS).eq("user_id", user_id).execute()
+    return result.data
+@db_query
+def track_game_for_user(user_id: int, app_id: int) -> bool:
+    # one idempotent round trip; returns False when the user was already tracking the game
     try:
-        result = supabase.table("user_games").insert({"user_id": user_id, "app_id": app_id}).execute()
-        return result.data
+        result = supabase.table("user_games").upsert(
+            {"user_id": user_id, "app_id": app_id},
+            on_conflict="user_id,app_id",
+            ignore_duplicates=True
+        ).execute()
+        return bool(result.data)
     except Exception as e:
         status_code = getattr(e, "status_code", 500)
         detail = str(e)
         raise HTTPException(status_code=status_code, detail=detail)
 
-def price_drop_notifications(app_id: int, game_name: str, new_price: float, discount_percent: int):
+@db_query
+def get_tracked_app_ids(user_id: str, app_ids: list) -> set:
+    tracked = set()
+    for chunk in chunks(app_ids):
+        result = supabase.table("user_games").select("app_id").eq("user_id", user_id).in_("app_id", chunk).execute()
+        tracked.update(row["app_id"] for row in result.data or [])
+    return tracked
+
+@db_query
+def track_games_for_user(user_id: str, app_ids: list):
+    # like track_game_for_user, rows the user already tracks are skipped and left out of the result
+    rows = [{"user_id": user_id, "app_id": app_id} for app_id in app_ids]
+    inserted = []
+    for chunk in chunks(rows):
+        result = supabase.table("user_games").upsert(
+            chunk,
+            on_conflict="user_id,app_id",
+            ignore_duplicates=True
+        ).execute()
+        inserted.extend(result.data or [])
+    return inserted
+
+async def price_drop_notifications(app_id: int, game_name: str, new_price: float, discount_percent: int):
     now = datetime.now(timezone.utc)
 
-    result = supabase.table("user_games").select("user_id", "last_notified_at").eq("app_id", app_id).execute()
+    result = await run_query(supabase.table("user_games").select("user_id", "last_notified_at").eq("app_id", app_id).execute,
+                             name="user_games.price_drop_trackers")
     tracked = result.data
     if not tracked:
         logger.info(f"No users tracking game id {app_id}")
@@ -37,25 +77,29 @@ def price_drop_notifications(app_id: int, game_name: str, new_price: float, disc
                 continue
 
 
-        get_emails = supabase.table("user_profiles").select("email").eq("supabase_id", user_id).execute()
+        get_emails = await run_query(supabase.table("user_profiles").select("email").eq("supabase_id", user_id).execute,
+                                     name="user_games.price_drop_emails")
         emails = [user["email"] for user in get_emails.data if user.get("email")]
 
         if not emails:
             logger.warning(f"No emails found for users tracking game {app_id}")
             return
 
-        for email in emails:
-            subject = f"Price Drop Alert: {game_name}"
-            text = f"{game_name} is now ${new_price:.2f} ({discount_percent}% off on Steam!)"
-            status, response = send_email(to_email=email, subject=subject, text=text)
+        subject = f"Price Drop Alert: {game_name}"
+        text = f"{game_name} is now ${new_price:.2f} ({discount_percent}% off on Steam!)"
+        queued = [(email, outbox.submit(to_email=email, subject=subject, text=text)) for email in emails]
+        for email, future in queued:
+            status, response = await asyncio.wrap_future(future)
 
             if status == 200:
                 logger.info(f"Email sent to {email} for {game_name}")
-                supabase.table("user_games").update({"last_notified_at": datetime.now(timezone.utc).isoformat()}).eq("user_id", user_id).eq("app_id", app_id).execute()
+                await run_query(supabase.table("user_games").update({"last_notified_at": datetime.now(timezone.utc).isoformat()}).eq("user_id", user_id).eq("app_id", app_id).execute,
+                                name="user_games.price_drop_notified")
             else:
                 logger.warning(f"Failed to send email to {email}: {response}")
         logger.info(f"Sent price drop emails for {game_name} to {len(emails)} users")
 
+@db_query
 def untrack_game_for_user(user_id: int, app_id: int):
     result = supabase.table("user_games").delete().eq("user_id", user_id).eq("app_id", app_id).execute()
     if not result.data:
@@ -1,14 +1,35 @@
 from backend.supabase_client import supabase
+from backend.supabase_services.db import db_query
 import logging
 
 logger = logging.getLogger(__name__)
+@db_query
+def get_admin_flag(user_id: str) -> bool:
+    # raises on database errors so callers can tell "not an admin" from "couldn't check"
+    result = supabase.table("user_profiles").select("is_admin").eq("supabase_id", user_id).execute()
+    if result.data and len(result.data) > 0:
+        return bool(result.data[0].get("is_admin", False))
+    return False
+
+@db_query
 def is_admin(user_id: str) -> bool:
     try:
-        result = supabase.table("user_profiles").select("is_admin").eq("supabase_id", user_id).execute()
-        if result.data and len(result.data) > 0:
-            return result.data[0].get("is_admin", False)
-        else:
-            return False
+        return get_admin_flag.sync(user_id)
     except Exception as e:
         logger.error(f"Error checking if user is admin: {e}")
-        return False
\ No newline at end of file
+        return False
+
+@db_query
+def insert_new_profiles(profiles: list) -> list:
+    # ignore_duplicates returns only the rows that were actually created, whichever worker got there first
+    if not profiles:
+        return []
+    result = supabase.table("user_profiles").upsert(profiles, on_conflict="supabase_id", ignore_duplicates=True).execute()
+    return result.data or []
+
+@db_query
+def upsert_profiles(profiles: list) -> list:
+    if not profiles:
+        return []
+    result = supabase.table("user_profiles").upsert(profiles, on_conflict="supabase_id").execute()
+    return result.data or []
\ No newline at end of file
@@ -1,66 +1,303 @@
 from locale import currency
-from backend.supabase_client import supabase
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from collections import defaultdict, OrderedDict
+from datetime import datetime, timezone
+from contextlib import contextmanager
 import asyncio
 import logging
-from backend.supabase_services.game_services import get_games, update_game_price
+import os
+import time
+import uuid
+from backend.supabase_services.game_services import get_games, update_game_price, upsert_game_prices
 from backend.api.helper import get_game_data
-from backend.supabase_services.price_history_services import insert_price_history, get_latest_price
+from backend.api.rate_limiter import request_priority, BACKGROUND
+from backend.supabase_services.price_history_services import insert_price_history, insert_price_history_batch
+from backend.supabase_services.batch_writer import BatchWriter
+from backend.supabase_services.db import run_query
 from backend.supabase_services.user_games_services import price_drop_notifications
-from backend.supabase_services.price_alert_services import check_price_alerts
-scheduler = BackgroundScheduler()
+from backend.supabase_services.price_alert_services import check_price_alerts, reset_triggered_alerts
+from backend.sync_schedule import schedule, SYNC_TICK_MINUTES
+scheduler = AsyncIOScheduler()
 logger = logging.getLogger("price_sync")
+
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "16"))
+SYNC_JOB_HISTORY = 20
+
+# must be called from the app's event loop so scheduled runs share it with /admin/sync
 def start():
-    scheduler.add_job(sync_prices, 'interval', hours=4)
+    scheduler.add_job(sync_prices, 'interval', minutes=SYNC_TICK_MINUTES)
     scheduler.start()
     logger.info("Price syncing started.")
 
-def sync_prices():
-    asyncio.run(run_sync_prices())
+async def stop():
+    # the running sync still needs the query pool and outbox, so it finishes cancelling before they close
+    scheduler.shutdown(wait=False)
+    job = _current_job
+    if job and job.task and not job.task.done():
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
 
-async def run_sync_prices():
-    logger.info("syncing prices...")
-    games = get_games()
+async def sync_prices():
+    # each tick syncs only the games whose next-due time has passed
+    if _current_job and _current_job.is_running:
+        logger.info(f"Sync {_current_job.id} still running, skipping this tick.")
+        return
+    games = await get_games()
+    await run_query(schedule.refresh_signals)
+    due = schedule.due_games(games)
+    if not due:
+        logger.info("No games due for a price sync.")
+        return
+    logger.info(f"{len(due)} of {len(games)} games due for a price sync.")
+    submit_sync(trigger="scheduled", games=due)
 
-    for game in games.data:
-        app_id = game["app_id"]
-        game_id = game["id"]
-        currency = game.get("currency")
+class SyncStats:
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.processed = 0
+        self.changed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.stage_seconds = defaultdict(float)
+        # game ids whose price or discount moved, and the subset whose sale just ended
+        self.changed_game_ids = set()
+        self.sale_ended_game_ids = set()
+        # game_id -> app_id for checked prices whose writes are still queued in a batch writer
+        self.unwritten_checks = {}
+        self.started_at = time.perf_counter()
 
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
         try:
+            yield
+        finally:
+            self.stage_seconds[name] += time.perf_counter() - started
+
+    def eta_seconds(self):
+        elapsed = time.perf_counter() - self.started_at
+        if not self.processed or elapsed <= 0:
+            return None
+        return (self.total - self.processed) / (self.processed / elapsed)
+
+    def log_summary(self):
+        elapsed = time.perf_counter() - self.started_at
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"Sync finished: {self.processed}/{self.total} games in {elapsed:.1f}s ({rate:.2f} games/sec), "
+            f"{self.changed} changed, {self.skipped} skipped, {self.failed} failed."
+        )
+        for name, seconds in self.stage_seconds.items():
+            per_game = seconds / self.processed if self.processed else 0.0
+            logger.info(f"  stage {name}: {seconds:.1f}s total, {per_game * 1000:.0f}ms avg per game")
+
+class SyncJob:
+    def __init__(self, trigger: str):
+        self.id = uuid.uuid4().hex
+        self.trigger = trigger
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.stats = SyncStats()
+        self.task = None
+
+    @property
+    def is_running(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        eta = self.stats.eta_seconds() if self.status == "running" else None
+        return {
+            "job_id": self.id,
+            "trigger": self.trigger,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "total": self.stats.total,
+            "processed": self.stats.processed,
+            "changed": self.stats.changed,
+            "skipped": self.stats.skipped,
+            "failed": self.stats.failed,
+            "eta_seconds": round(eta) if eta is not None else None,
+            "error": self.error,
+        }
+
+_jobs = OrderedDict()
+_current_job = None
+
+def submit_sync(trigger: str = "manual", games: list = None):
+    # only one run at a time: a request during a run joins the run already in progress
+    global _current_job
+    if _current_job and _current_job.is_running:
+        logger.info(f"Sync {_current_job.id} already running, {trigger} request joined it.")
+        return _current_job, False
+
+    job = SyncJob(trigger)
+    _jobs[job.id] = job
+    while len(_jobs) > SYNC_JOB_HISTORY:
+        _jobs.popitem(last=False)
+    _current_job = job
+    job.task = asyncio.create_task(_run_job(job, games))
+    return job, True
+
+async def _run_job(job: SyncJob, games: list = None):
+    job.status = "running"
+    job.started_at = datetime.now(timezone.utc)
+    try:
+        await run_sync_prices(stats=job.stats, games=games)
+        job.status = "completed"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"Sync {job.id} failed: {e}")
+    finally:
+        # a cancelled run (e.g. on shutdown) must not stay "running" and block every later sync
+        if job.is_running:
+            job.status = "cancelled"
+            job.error = job.error or "Sync was cancelled."
+            logger.warning(f"Sync {job.id} was cancelled.")
+        job.finished_at = datetime.now(timezone.utc)
+
+def get_sync_job(job_id: str = None):
+    if job_id is None:
+        return _current_job
+    return _jobs.get(job_id)
+
+async def _insert_price_history_row(entry: dict):
+    await insert_price_history(**entry)
+
+async def _update_game_price_row(game: dict):
+    await update_game_price(game["app_id"], new_price=game["last_known_price"], discount_percent=game["discount_percent"])
+
+async def sync_game(game: dict, stats: SyncStats, latest_prices: dict, history_writer: BatchWriter, pending_games: dict):
+    app_id = game["app_id"]
+    game_id = game["id"]
+    currency = game.get("currency")
+    changed = False
+
+    try:
+        with stats.stage("steam_fetch"):
             steam_api_call = await get_game_data(app_id)
-            price_info = steam_api_call["data"].get("price_overview")
-            if not price_info:
-                logger.info(f"Skipping {game['name']} since it is free.")
-                continue
-
-            new_current = price_info["final"] / 100
-            new_initial = price_info["initial"] / 100
-            new_discount = price_info["discount_percent"]
-
-            latest = get_latest_price(game_id)
-            latest_current = float(latest["final_price"]) if latest else None
-            latest_discount = int(latest["discount_percent"]) if latest else None
-
-            if new_current != latest_current or new_discount != latest_discount:
-
-                insert_price_history(
-                    game_id=game_id,
-                    initial_price=new_initial,
-                    final_price=new_current,
-                    discount_percent=new_discount,
-                    currency=currency
-
-                )
-                logger.info(f"logged price history change for {game['name']} (${new_current}, {new_discount}% off).")
-                update_game_price(app_id, new_price=new_current, discount_percent=new_discount)
-                if new_discount == 0 and latest_discount > 0:
-                    supabase.table("price_alerts").update({"triggered_at": None}).eq("game_id", game_id).execute()
-                    logger.info(f"Reset price alert for {game['name']} - sale ended.")
-                logger.info(f"Updated {game['name']}'s price, but no drop detected.")
-        except Exception as e:
-            logger.error(f"Error syncing game {app_id}: {e}")
-    check_price_alerts()
-    logger.info(f"Price alerts check complete.")
+        price_info = steam_api_call["data"].get("price_overview")
+        if not price_info:
+            logger.info(f"Skipping {game['name']} since it is free.")
+            stats.skipped += 1
+            schedule.record_price_check(app_id)
+            return
+
+        new_current = price_info["final"] / 100
+        new_initial = price_info["initial"] / 100
+        new_discount = price_info["discount_percent"]
+
+        latest = latest_prices.get(game_id)
+        latest_current = float(latest["final_price"]) if latest else None
+        latest_discount = int(latest["discount_percent"]) if latest else None
+
+        if new_current != latest_current or new_discount != latest_discount:
+            entry = {
+                "game_id": game_id,
+                "initial_price": new_initial,
+                "final_price": new_current,
+                "discount_percent": new_discount,
+                "currency": currency
+            }
+            # keep the snapshot in step with what this run writes
+            latest_prices[game_id] = entry
+            # the games row is queued once this history row is stored, see run_sync_prices; it must be
+            # parked first, since add() can flush straight away
+            pending_games[game_id] = {**game, "last_known_price": new_current, "discount_percent": new_discount}
+            await history_writer.add(entry)
+            logger.info(f"queued price history change for {game['name']} (${new_current}, {new_discount}% off).")
+            if new_discount == 0 and latest_discount:
+                stats.sale_ended_game_ids.add(game_id)
+                logger.info(f"Sale ended for {game['name']}, its price alerts will be reset.")
+            changed = True
+            stats.changed += 1
+            stats.changed_game_ids.add(game_id)
+            stats.unwritten_checks[game_id] = app_id
+            logger.info(f"Updated {game['name']}'s price, but no drop detected.")
+        else:
+            schedule.record_price_check(app_id)
+    except Exception as e:
+        stats.failed += 1
+        logger.error(f"Error syncing game {app_id}: {e}")
+    finally:
+        stats.processed += 1
+        schedule.mark_synced(game, changed=changed)
+
+def latest_prices_from_games(games: list) -> dict:
+    # a games row only takes a new price after its price_history row is stored, so the rows the
+    # sync already loaded are the latest-price snapshot; no history scan needed
+    return {
+        game["id"]: {"final_price": game["last_known_price"], "discount_percent": game.get("discount_percent") or 0}
+        for game in games if game.get("last_known_price") is not None
+    }
+
+async def run_sync_prices(concurrency: int = None, stats: SyncStats = None, games: list = None):
+    logger.info("syncing prices...")
+    # Steam calls made by this run queue behind interactive requests
+    request_priority.set(BACKGROUND)
+    stats = stats or SyncStats()
+    if games is None:
+        games = await get_games()
+    stats.total = len(games)
+    latest_prices = latest_prices_from_games(games)
+    semaphore = asyncio.Semaphore(concurrency or SYNC_CONCURRENCY)
+
+    # game_id -> updated games row, held back until its history row is written; a failed history
+    # write leaves the games row on the old price, so the next run still sees the change
+    pending_games = {}
+
+    async def release_games(entries: list):
+        for entry in entries:
+            await games_writer.add(pending_games.pop(entry["game_id"]))
+
+    # the writers flush in the background, so the write stages time the database calls themselves
+    async def write_history(entries: list):
+        with stats.stage("history_write"):
+            await insert_price_history_batch(entries)
+        await release_games(entries)
+
+    async def write_history_row(entry: dict):
+        with stats.stage("history_write"):
+            await _insert_price_history_row(entry)
+        await release_games([entry])
+
+    async def write_games(rows: list):
+        with stats.stage("games_write"):
+            await upsert_game_prices(rows)
+
+    async def write_game_row(row: dict):
+        with stats.stage("games_write"):
+            await _update_game_price_row(row)
+
+    games_writer = BatchWriter("games", write_games, write_game_row)
+    history_writer = BatchWriter("price_history", write_history, write_history_row)
+
+    async def bounded_sync(game):
+        async with semaphore:
+            await sync_game(game, stats, latest_prices, history_writer, pending_games)
+
+    # history exits first, so its last flush still reaches the games writer
+    async with games_writer, history_writer:
+        await asyncio.gather(*[bounded_sync(game) for game in games])
+    # changed prices only count as fresh once both writes landed
+    failed = set(pending_games) | {row["id"] for row in games_writer.failed}
+    for game_id, app_id in stats.unwritten_checks.items():
+        if game_id not in failed:
+            schedule.record_price_check(app_id)
+    if stats.sale_ended_game_ids:
+        await reset_triggered_alerts(stats.sale_ended_game_ids)
+        logger.info(f"Reset price alerts for {len(stats.sale_ended_game_ids)} games - sale ended.")
+    stats.log_summary()
+
+    await check_price_alerts(stats.changed_game_ids)
+    logger.info(f"Price alerts check complete for {len(stats.changed_game_ids)} changed games and any new alerts.")
 
     #logger.info("Syncing complete.")
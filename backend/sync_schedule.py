@@ -0,0 +1,112 @@
+from backend.supabase_client import supabase
+from backend.supabase_services.db import fetch_pages
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import random
+
+logger = logging.getLogger("price_sync")
+
+SYNC_TICK_MINUTES = int(os.getenv("SYNC_TICK_MINUTES", "15"))
+MIN_SYNC_INTERVAL = timedelta(minutes=int(os.getenv("MIN_SYNC_INTERVAL_MINUTES", "30")))
+BASE_SYNC_INTERVAL = timedelta(hours=float(os.getenv("BASE_SYNC_INTERVAL_HOURS", "4")))
+MAX_SYNC_INTERVAL = timedelta(hours=float(os.getenv("MAX_SYNC_INTERVAL_HOURS", "24")))
+SIGNAL_REFRESH_INTERVAL = timedelta(hours=1)
+VOLATILITY_WINDOW = timedelta(days=90)
+
+# Steam's recurring seasonal sales as MM-DD ranges; override with e.g. "06-26:07-10,12-19:01-02"
+DEFAULT_SALE_WINDOWS = "03-13:03-20,06-26:07-10,09-29:10-06,11-26:12-03,12-19:01-02"
+
+def parse_sale_windows(value: str):
+    windows = []
+    for window in value.split(","):
+        if window.strip():
+            start, end = window.strip().split(":")
+            windows.append((start, end))
+    return windows
+
+SALE_WINDOWS = parse_sale_windows(os.getenv("STEAM_SALE_WINDOWS", DEFAULT_SALE_WINDOWS))
+
+def in_sale_window(now: datetime) -> bool:
+    today = now.strftime("%m-%d")
+    for start, end in SALE_WINDOWS:
+        # windows like 12-19:01-02 wrap around the new year
+        if start <= end and start <= today <= end:
+            return True
+        if start > end and (today >= start or today <= end):
+            return True
+    return False
+
+def _count_column(table: str, column: str, apply_filters=lambda query: query):
+    counts = Counter()
+    # ranges are only stable under an order; ties share a value, so they can't skew the counts
+    for rows in fetch_pages(lambda: apply_filters(supabase.table(table).select(column)).order(column)):
+        counts.update(row[column] for row in rows)
+    return counts
+
+class SyncSchedule:
+    def __init__(self):
+        self.next_due = {}
+        # app_id -> last time its Steam price was read and stored; kept in memory, so each worker has its own
+        self.price_checked_at = {}
+        self.trackers = Counter()  # app_id -> users tracking it
+        self.alerts = Counter()  # game_id -> active alerts
+        self.changes = Counter()  # game_id -> price changes inside the volatility window
+        self.signals_loaded_at = None
+
+    def refresh_signals(self, now: datetime = None):
+        now = now or datetime.now(timezone.utc)
+        if self.signals_loaded_at and now - self.signals_loaded_at < SIGNAL_REFRESH_INTERVAL:
+            return
+        since = (now - VOLATILITY_WINDOW).isoformat()
+        self.trackers = _count_column("user_games", "app_id")
+        self.alerts = _count_column("price_alerts", "game_id", lambda query: query.eq("is_active", True))
+        self.changes = _count_column("price_history", "game_id", lambda query: query.gte("timestamp", since))
+        self.signals_loaded_at = now
+        logger.info(
+            f"Sync priorities refreshed: {len(self.trackers)} tracked games, "
+            f"{len(self.alerts)} games with alerts, {len(self.changes)} games with recent changes."
+        )
+
+    def interval_for(self, game: dict, now: datetime) -> timedelta:
+        trackers = self.trackers[game["app_id"]]
+        alerts = self.alerts[game["id"]]
+        changes = self.changes[game["id"]]
+        if not (trackers or alerts or changes):
+            return MAX_SYNC_INTERVAL
+
+        score = 1 + trackers + 2 * alerts + changes
+        if game.get("discount_percent"):
+            score *= 2  # a running discount can end at any time
+        if in_sale_window(now):
+            score *= 2
+        return max(MIN_SYNC_INTERVAL, min(MAX_SYNC_INTERVAL, BASE_SYNC_INTERVAL / score))
+
+    def due_games(self, games: list, now: datetime = None) -> list:
+        now = now or datetime.now(timezone.utc)
+        due = []
+        for game in games:
+            next_due = self.next_due.get(game["app_id"])
+            if next_due is None:
+                # spread first sightings over their interval so a restart doesn't refetch the whole catalog at once
+                next_due = now + self.interval_for(game, now) * random.random()
+                self.next_due[game["app_id"]] = next_due
+            if next_due <= now:
+                due.append(game)
+        return due
+
+    def mark_synced(self, game: dict, changed: bool = False, now: datetime = None):
+        now = now or datetime.now(timezone.utc)
+        if changed:
+            self.changes[game["id"]] += 1
+        self.next_due[game["app_id"]] = now + self.interval_for(game, now)
+
+    def record_price_check(self, app_id: int, now: datetime = None):
+        self.price_checked_at[app_id] = now or datetime.now(timezone.utc)
+
+    def is_price_fresh(self, app_id: int, window: timedelta, now: datetime = None) -> bool:
+        checked_at = self.price_checked_at.get(app_id)
+        return checked_at is not None and (now or datetime.now(timezone.utc)) - checked_at <= window
+
+schedule = SyncSchedule()
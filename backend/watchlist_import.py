@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+from fastapi import HTTPException
+from backend.api.helper import get_game_data
+from backend.api.rate_limiter import request_priority, BACKGROUND
+from backend.models.game import Game
+from backend.supabase_services.game_services import get_games_by_app_ids, upsert_game_prices
+from backend.supabase_services.price_history_services import insert_price_history_batch
+from backend.supabase_services.user_games_services import get_tracked_app_ids, track_games_for_user
+
+logger = logging.getLogger(__name__)
+
+IMPORT_MAX_APPS = int(os.getenv("IMPORT_MAX_APPS", "500"))
+IMPORT_FETCH_CONCURRENCY = int(os.getenv("IMPORT_FETCH_CONCURRENCY", "8"))
+# unknown games looked up on Steam inside the request; the rest are fetched and tracked in the background
+IMPORT_SYNC_FETCH_LIMIT = int(os.getenv("IMPORT_SYNC_FETCH_LIMIT", "10"))
+
+_deferred_imports = set()  # the loop only keeps weak references to tasks
+
+def game_from_app_data(app_id: int, game_data: dict) -> Game:
+    price = game_data.get("price_overview")
+    return Game(
+        app_id=app_id,
+        name=game_data["name"],
+        currency=price.get("currency") if price else None,
+        is_free=not price,
+        last_known_price=price["final"] / 100 if price else None,
+        discount_percent=price.get("discount_percent", 0) if price else 0
+    )
+
+async def _fetch_unknown_games(app_ids: list, results: dict):
+    # the appdetails limiter paces the calls; the semaphore just bounds in-flight requests
+    semaphore = asyncio.Semaphore(IMPORT_FETCH_CONCURRENCY)
+    fetched = {}
+
+    async def fetch(app_id):
+        async with semaphore:
+            try:
+                app_data = await get_game_data(app_id)
+                fetched[app_id] = app_data["data"]
+            except HTTPException as e:
+                results[app_id] = {"app_id": app_id, "status": "not_found" if e.status_code == 404 else "error",
+                                   "detail": e.detail}
+            except Exception as e:
+                logger.error(f"Failed to fetch app {app_id} during import: {e}")
+                results[app_id] = {"app_id": app_id, "status": "error", "detail": "Failed to fetch game from Steam."}
+
+    await asyncio.gather(*[fetch(app_id) for app_id in app_ids])
+    return fetched
+
+def _history_entry(game: dict, price: dict) -> dict:
+    return {
+        "game_id": game["id"],
+        "initial_price": price["initial"] / 100,
+        "final_price": price["final"] / 100,
+        "discount_percent": price.get("discount_percent", 0),
+        "currency": price.get("currency")
+    }
+
+async def _save_fetched(user_id: str, fetched: dict, games: dict):
+    new_games = [game_from_app_data(app_id, data).model_dump() for app_id, data in fetched.items()]
+    try:
+        inserted = await upsert_game_prices(new_games)
+        games.update({game["app_id"]: game for game in inserted or []})
+    except Exception as e:
+        # the fetched games stay out of `games`, so each gets its own error result
+        logger.error(f"Failed to save {len(new_games)} imported games for {user_id}: {e}")
+
+    history = [_history_entry(games[app_id], data["price_overview"])
+               for app_id, data in fetched.items() if app_id in games and data.get("price_overview")]
+    try:
+        await insert_price_history_batch(history)
+    except Exception as e:
+        logger.error(f"Failed to record price history for imported games: {e}")
+
+async def _import_deferred(user_id: str, app_ids: list):
+    # Steam lookups beyond the in-request limit queue behind interactive calls
+    request_priority.set(BACKGROUND)
+    try:
+        errors = {}
+        games = {}
+        fetched = await _fetch_unknown_games(app_ids, errors)
+        if fetched:
+            await _save_fetched(user_id, fetched, games)
+        tracked = await track_games_for_user(user_id, list(games))
+        logger.info(f"Deferred import for {user_id}: {len(tracked)} of {len(app_ids)} games tracked, "
+                    f"{len(errors)} not found or failed.")
+    except Exception as e:
+        logger.error(f"Deferred import for {user_id} failed: {e}")
+
+def _start_deferred_import(user_id: str, app_ids: list):
+    task = asyncio.create_task(_import_deferred(user_id, app_ids))
+    _deferred_imports.add(task)
+    task.add_done_callback(_deferred_imports.discard)
+
+async def import_watchlist(user_id: str, app_ids: list) -> dict:
+    app_ids = list(dict.fromkeys(app_ids))
+    if not app_ids:
+        raise HTTPException(status_code=400, detail="No app_ids provided.")
+    if len(app_ids) > IMPORT_MAX_APPS:
+        raise HTTPException(status_code=400, detail=f"At most {IMPORT_MAX_APPS} games can be imported at once.")
+
+    known_games, tracked = await asyncio.gather(
+        get_games_by_app_ids(app_ids),
+        get_tracked_app_ids(user_id, app_ids)
+    )
+    games = {game["app_id"]: game for game in known_games}
+    results = {}
+
+    unknown = [app_id for app_id in app_ids if app_id not in games]
+    # each lookup costs an appdetails token (about 0.66/s), so a long wishlist can't hold the request open
+    deferred = unknown[IMPORT_SYNC_FETCH_LIMIT:]
+    fetched = await _fetch_unknown_games(unknown[:IMPORT_SYNC_FETCH_LIMIT], results)
+    if fetched:
+        await _save_fetched(user_id, fetched, games)
+
+    to_track = [app_id for app_id in app_ids if app_id in games and app_id not in tracked]
+    newly_tracked = {row["app_id"] for row in await track_games_for_user(user_id, to_track)}
+    # rows the upsert skipped were tracked by a concurrent request after the lookup above
+    tracked.update(app_id for app_id in to_track if app_id not in newly_tracked)
+
+    for app_id in deferred:
+        results[app_id] = {"app_id": app_id, "status": "pending",
+                           "detail": "Game will be fetched from Steam and tracked shortly."}
+    if deferred:
+        _start_deferred_import(user_id, deferred)
+
+    for app_id in app_ids:
+        if app_id in results:
+            continue
+        if app_id not in games:
+            results[app_id] = {"app_id": app_id, "status": "error", "detail": "Failed to save game."}
+            continue
+        game = games[app_id]
+        results[app_id] = {
+            "app_id": app_id,
+            "status": "already_tracking" if app_id in tracked else "tracked",
+            "name": game.get("name"),
+            "last_known_price": game.get("last_known_price"),
+            "discount_percent": game.get("discount_percent"),
+            "is_free": game.get("is_free")
+        }
+
+    ordered = [results[app_id] for app_id in app_ids]
+    summary = {}
+    for result in ordered:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    logger.info(f"Watchlist import for {user_id}: {summary}")
+    return {"results": ordered, "summary": summary}